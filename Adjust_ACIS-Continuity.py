@@ -5,6 +5,13 @@ import shutil
 import apt_date_secs as apt
 #import BackstopCommandsClass
 from backstop_history import BackstopHistory
+
+# Keep astropy from going to the network for IERS or leap second data.
+# apt_date_secs configures astropy itself, but only when it first needs it.
+# backstop_history converts times with astropy directly, so astropy has to
+# be configured here, before backstop_history is used.
+import Time_Configuration
+Time_Configuration.Configure_Astropy()
 """
 Adjust_ACIS-Continuity.py - LR has determined that a continuity load was reviewed as a full load,
                                               but was uplinked and run VEHICLE ONLY because the load prior to
@@ -0,0 +1,192 @@
+################################################################################
+#
+#  Audit_Power_Cmds - Run the power command checks over many archived loads
+#                     at once and write a single report of all the
+#                     violations that were found.
+#
+#                     Use this to re-validate a change to Rulesets.py
+#                     against past loads. Nothing in the OFLS directories
+#                     is changed.
+#
+################################################################################
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import time
+
+# Bring in the Backstop File Class
+import Backstop_File_Class
+
+# Bring in the power command checks
+import Check_Power_Cmds
+
+"""
+Audit_Power_Cmds - Run Check_Power_Cmds.check_power_commands over the
+                   CR*.backstop file of each OFLS directory given on the
+                   command line, several loads at a time, and write one
+                   report of the results.
+
+    Usage:
+
+    python3 Audit_Power_Cmds.py [-o report.csv] [-j jobs] <OFLS dir or glob> ...
+
+    e.g.
+
+    python3 Audit_Power_Cmds.py -o audit.json '/data/acis/LoadReviews/2024/*/ofls*'
+
+    Quote the globs so that they are expanded here rather than by the shell;
+    the shell limits the length of the command line.
+
+    The report is JSON if its name ends in .json, CSV otherwise.
+
+        JSON - a list with one entry per load, giving the OFLS directory,
+               backstop file, status, time taken and the list of violations.
+
+        CSV - one row per violation. Loads with no violations, or which
+              could not be checked, get one row with the violation
+              columns empty.
+
+    status is "ok" if the load was checked, otherwise the error which
+    stopped it (e.g. no CR*.backstop file in the directory).
+"""
+
+# Columns of the CSV report
+report_columns = ['ofls_dir', 'backstop_file', 'status', 'seconds', 'num_violations',
+                  'vio_date', 'vio_time', 'vio_rule']
+
+#-------------------------------------------------------------------------------
+#  Function: find_ofls_dirs - Expand the command line arguments into a sorted
+#                             list of OFLS directories
+#-------------------------------------------------------------------------------
+def find_ofls_dirs(ofls_args):
+    """
+    Each argument can be a directory or a glob pattern which matches
+    directories. Anything which is not a directory is dropped, as are
+    duplicates.
+    """
+    ofls_dirs = set()
+
+    for each_arg in ofls_args:
+        # A glob with no wild cards matches itself, if it exists
+        for each_path in glob.glob(each_arg):
+            if os.path.isdir(each_path):
+                ofls_dirs.add(os.path.normpath(each_path))
+
+    return sorted(ofls_dirs)
+
+#-------------------------------------------------------------------------------
+#  Function: audit_one_load - Run the power command checks on one OFLS directory
+#-------------------------------------------------------------------------------
+def audit_one_load(ofls_dir):
+    """
+    Run the power command checks over the CR*.backstop file in ofls_dir.
+
+    Runs in a worker process, so any error is caught and reported in the
+    result rather than raised.
+
+    Returns a dict with the OFLS directory, the backstop file, the status,
+    the time taken in seconds and the list of violations.
+    """
+    start_time = time.perf_counter()
+
+    result = {'ofls_dir': ofls_dir,
+              'backstop_file': '',
+              'status': 'ok',
+              'seconds': 0.0,
+              'violations': []}
+
+    try:
+        backstop_files = sorted(glob.glob(os.path.join(ofls_dir, 'CR*.backstop')))
+
+        if len(backstop_files) == 0:
+            raise FileNotFoundError('No CR*.backstop file')
+
+        result['backstop_file'] = backstop_files[0]
+
+        bfc = Backstop_File_Class.Backstop_File_Object(True)
+        system_packets = bfc.strip_out_pertinent_packets(backstop_files[0])
+
+        # Make the violations plain python values so they can be written out
+        for each_violation in Check_Power_Cmds.check_power_commands(system_packets):
+            result['violations'].append({'vio_date': str(each_violation['vio_date']),
+                                         'vio_time': float(each_violation['vio_time']),
+                                         'vio_rule': str(each_violation['vio_rule'])})
+    except Exception as err:
+        result['status'] = type(err).__name__ + ': ' + str(err)
+
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+
+    return result
+
+#-------------------------------------------------------------------------------
+#  Function: write_report - Write the results of all the loads to a CSV or
+#                           JSON file
+#-------------------------------------------------------------------------------
+def write_report(report_file, results):
+    """
+    Write the list of results from audit_one_load to report_file. The
+    format is JSON if the file name ends in .json, CSV otherwise.
+    """
+    outfile = open(report_file, 'w', newline = '')
+
+    if report_file.lower().endswith('.json'):
+        json.dump(results, outfile, indent = 2)
+    else:
+        writer = csv.DictWriter(outfile, fieldnames = report_columns)
+        writer.writeheader()
+
+        for each_result in results:
+            load_columns = {'ofls_dir': each_result['ofls_dir'],
+                            'backstop_file': each_result['backstop_file'],
+                            'status': each_result['status'],
+                            'seconds': each_result['seconds'],
+                            'num_violations': len(each_result['violations'])}
+
+            if len(each_result['violations']) == 0:
+                writer.writerow(load_columns)
+
+            for each_violation in each_result['violations']:
+                writer.writerow(dict(load_columns, **each_violation))
+
+    outfile.close()
+
+
+# =======================  MAIN ==========================================
+if __name__ == '__main__':
+    # Using ARGPARSE
+    cl_parser = argparse.ArgumentParser(description='Run the power command checks over many loads')
+
+    cl_parser.add_argument('ofls_dirs', nargs = '+', help = 'OFLS directories, or glob patterns matching them')
+
+    cl_parser.add_argument('-o', '--output', default = 'Power_Cmds_Audit.csv', help = 'Report file. JSON if it ends in .json, CSV otherwise')
+
+    cl_parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count(), help = 'Number of loads to check at once')
+
+    # Parse out the args
+    audit_args = cl_parser.parse_args()
+
+    ofls_dirs = find_ofls_dirs(audit_args.ofls_dirs)
+
+    print('\n    Auditing', len(ofls_dirs), 'loads with', audit_args.jobs, 'processes')
+
+    audit_start = time.perf_counter()
+
+    # Check the loads in parallel. map returns the results in the order
+    # of ofls_dirs no matter which finishes first.
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers = audit_args.jobs)
+    results = list(executor.map(audit_one_load, ofls_dirs))
+    executor.shutdown()
+
+    write_report(audit_args.output, results)
+
+    # Summarize
+    failed = [each_result for each_result in results if each_result['status'] != 'ok']
+    with_violations = [each_result for each_result in results if len(each_result['violations']) > 0]
+
+    print('    Loads with violations:', len(with_violations))
+    print('    Loads which could not be checked:', len(failed))
+    print('    Total time:', round(time.perf_counter() - audit_start, 1), 'seconds')
+    print('    Report written to:', audit_args.output)
@@ -10,12 +10,11 @@
 #         - Fixed the erroneous firing of Rule #5 - the 63 second timing error
 #
 ################################################################################
-from astropy.time import Time
-from astropy.utils import iers
-import re
-import shutil
 import numpy as np
 
+import ALR_Document_Class
+import Backstop_File_Processing as bfp
+
 class Backstop_File_Object:
     """
     Class defined to read a specified backstop file for processing,
@@ -23,19 +22,25 @@ class Backstop_File_Object:
     and provides a method to write out a new ACIS-LoadReview.txt file
     complete with any error messages generated by the Check_Power_cmds program.
 
-    Methods:  strip_out_ACISPKTs
+    Methods:  strip_out_pertinent_packets
+              extract_pertinent_packets
+              extract_pertinent_commands
               write_previous_ACISPKT_cmd
+              write_bogus_previous_ACISPKT_cmd
               insert_errors
+              insert_errors_in_lines
 
     """
     def __init__(self, test_flag):
         self.backstop_file_name = ''
         self.error_list = []
         # Dtype definition for the ACISPKT lines in the Backstop file
+        # timing_rules is filled in by Rulesets.Evaluate_ACISPKT_Timing_Rules
         self.ACISPKT_dtype = [('event_date', 'U20'), \
                               ('event_time', '<f8'), \
                               ('cmd_type', 'U20'), \
-                              ('packet_or_cmd', 'U80')]
+                              ('packet_or_cmd', 'U80'), \
+                              ('timing_rules', '<u1')]
         # Create the empty array using the self.ACISPKT_dtype
         self.system_packets = np.array([], dtype = self.ACISPKT_dtype)
         # Previous ACISPKT command used for timing calcs
@@ -44,84 +49,106 @@ class Backstop_File_Object:
         # Capture the test flag passed to this object
         self.test_flag = test_flag
 
+        # Reads and parses the backstop commands
+        self.backstop_reader = bfp.Backstop_File_Class()
+
     #---------------------------------------------------------------------------
     #  Method:  strip_out_ACISPKTS - Read the input backstop file and strip
     #                                out packets useful to the power command
     #                                checker. These would be ACISPKTS and some
     #                                ORBPOINTS
     #---------------------------------------------------------------------------
-    def strip_out_pertinent_packets(self, backstop_file):
+    def strip_out_pertinent_packets(self, backstop_file, write_packets_file = False):
+        """
+        Reads the specified backstop file, strips out all ACISPKT
+        commands plus commands that carry perigee passage information,
+        and stores them in self.system_packets.
+
+        If write_packets_file is True the stripped-out lines
+        are also written to a file named <backstop_file>.ACISPKTs
+        """
+        # Read the backstop file into the commands array and pull the packets
+        # out of it. The parsed commands are cached (see
+        # Backstop_File_Processing.Read_BS_File) so re-running the check on
+        # the same load does not parse the file again.
+        self.extract_pertinent_commands(self.backstop_reader.Read_BS_File(backstop_file, use_cache = True))
+
+        # Save the stripped out lines if asked to
+        if write_packets_file:
+            # The rows of the commands array are the lines of the file
+            infile = open(backstop_file, 'r')
+            backstop_lines = infile.readlines()
+            infile.close()
+
+            # create file name for the output file by adding an '.ACISPKTs' extension
+            outfile = open(backstop_file+'.ACISPKTs', 'w')
+            outfile.writelines([backstop_lines[each_row] for each_row in self.packet_rows])
+            outfile.close()
+
+        # Return the extracted packets
+        return self.system_packets
+
+    #---------------------------------------------------------------------------
+    #  Method:  extract_pertinent_packets - Strip out the packets useful to
+    #                                       the power command checker from
+    #                                       backstop lines already in memory
+    #---------------------------------------------------------------------------
+    def extract_pertinent_packets(self, backstop_lines):
+        """
+        Given the lines of a backstop file, as a list or any other
+        iterable, strip out all ACISPKT commands plus commands that
+        carry perigee passage information, and store them in
+        self.system_packets. The lines themselves are kept in
+        self.packet_lines.
+        """
+        backstop_lines = list(backstop_lines)
+
+        self.extract_pertinent_commands(self.backstop_reader.Process_BS_Lines(backstop_lines))
+
+        self.packet_lines = [backstop_lines[each_row] for each_row in self.packet_rows]
+
+        # Return the extracted packets
+        return self.system_packets
+
+    #---------------------------------------------------------------------------
+    #  Method:  extract_pertinent_commands - Strip out the packets useful to
+    #                                        the power command checker from
+    #                                        a Backstop_File_Processing
+    #                                        commands array
+    #---------------------------------------------------------------------------
+    def extract_pertinent_commands(self, commands):
         """
-        Opens the specified backstop file, reads in
-        every line, strips out all ACISPKT lines plus
-        lines that contain perigee passage information,
-        and writes the collection of stripped-out lines
-        to a file names <backstop_file.ACISPKTs
+        Given an array of commands made by
+        Backstop_File_Processing.Backstop_File_Class, pick out all
+        ACISPKT commands plus commands that carry perigee passage
+        information and store them in self.system_packets. The rows
+        picked are kept in self.packet_rows.
+
+        The commands are picked, and their mnemonics taken, by comparing
+        the command_type, tlmsid and event_type columns which were
+        parsed when the commands were read. No command string is split
+        again here.
         """
-        # These are the perigee passage indicators we want to recognize
+        # These are the perigee passage indicators we want to recognize.
+        # They are the TLMSID of a COMMAND_SW command or the TYPE of an
+        # ORBPOINT command.
         pp_indicators = ['OORMPDS', 'EEF1000', 'EPERIGEE', 'XEF1000', 'OORMPEN']
 
-        # create file name for the output file by adding an '.ACISPKTs' extension
-        ACISPKT_file = backstop_file+'.ACISPKTs'
-
-        # Open the output file
-        outfile = open(ACISPKT_file, 'w')
-
-        # Open the load review text file
-        infile = open(backstop_file, 'r')
-
-        # Read in each line. If the line contains 'ACISPKT" then
-        # write it to the output file
-        for eachline in infile:
-            # If it's an ACISPKT line grab it without question
-            if 'ACISPKT' in eachline:
-                # Save it in the output file
-                outfile.write(eachline)
-                # Now extract the date and TLMSID values
-                # Start by splitting the line on vertical bars
-                split_line = eachline.split('|')
-                # Extract and clean up the date entry - remove any spaces
-                packet_time = split_line[0].strip()
-                cmd = split_line[3].split(',')[0].split()[-1]
-                # Load up an array line.  You need only grab
-                # the date, time, insert the word ACISPKT, and the mnemonic
-                self.system_packets = np.r_[self.system_packets,
-                                         np.array( [ ( split_line[0],
-                                                       Time(packet_time, format='yday', scale='utc').cxcsec,
-                                                       'ACISPKT',
-                                                       cmd)],
-                                                   dtype = self.ACISPKT_dtype)]
-
-            # Next check if the line is one of the perigee Passage indicators
-            if [True for pp_ind in pp_indicators if (pp_ind in eachline)]:
-                # You have stumbled upon a perigee passage indicator
-                # Save it in the output file
-                outfile.write(eachline)
-                # Now extract the date and TLMSID values
-                # Start by splitting the line on vertical bars
-                split_line = eachline.split('|')
-
-                # Extract and clean up the date entry - remove any spaces
-                packet_time = split_line[0].strip()
-
-                cmd = split_line[3].split(',')[0].split()[-1]
-
-                cmd_type = split_line[2].strip()
-
-                # Load up an array line.  You need only grab
-                # the date, time, insert the word ACISPKT, and the mnemonic
-                self.system_packets = np.r_[self.system_packets,
-                                     np.array( [ ( packet_time,
-                                                   Time(packet_time, format='yday', scale='utc').cxcsec,
-                                                   cmd_type,
-                                                   cmd)],
-                                               dtype = self.ACISPKT_dtype)]
-
-        # Done with the input file - close it.
-        infile.close()
-
-        # Done with the output file
-        outfile.close()
+        pertinent = (commands['command_type'] == 'ACISPKT') | \
+                    np.isin(commands['tlmsid'], pp_indicators) | \
+                    np.isin(commands['event_type'], pp_indicators)
+
+        self.packet_rows = np.nonzero(pertinent)[0]
+        packet_commands = commands[self.packet_rows]
+
+        # Build the array in one go. The mnemonic of each command is its
+        # TLMSID or, for ORBPOINTs, its TYPE.
+        self.system_packets = np.zeros(len(self.packet_rows), dtype = self.ACISPKT_dtype)
+
+        self.system_packets['event_date'] = packet_commands['date']
+        self.system_packets['event_time'] = packet_commands['time']
+        self.system_packets['cmd_type'] = packet_commands['command_type']
+        self.system_packets['packet_or_cmd'] = np.where(packet_commands['tlmsid'] != '', packet_commands['tlmsid'], packet_commands['event_type'])
 
         # Return the extracted packets
         return self.system_packets
@@ -204,71 +231,51 @@ class Backstop_File_Object:
                    '2018:064:20:11:59.529 Should be a WSPOW0 here'
 
         """
-        # Open the load review text file
-        infile = open(lr_file, 'r')
-
-        # Read all of the ALR.txt lines
-        ALR_lines = infile.readlines()
-
-        # Done with the input file - close it.
-        infile.close()
-
-        #
-        # Now find the indices of all those lines which have a time stamp at
-        # the start
-        #
-        # Define regular expressions to be used in backstop file line searches
-        time_stamp = re.compile('\d\d\d\d:\d\d\d:\d\d:\d\d:\d\d.\d\d\d')
-
-        # Get the indices of all those lines which begin with a DOY time stamp
-        # This is the position of the stamped line in the ALR file.
-        time_stamped_line_indices = [index for index, eachline in enumerate(ALR_lines) if time_stamp.match(eachline)]
-
-        # Next, get a list of the times in seconds for those lines which have a
-        # DOY time in them.  This is a one for one pairing of time_stamped_line_indices
-        event_times = [Time(ALR_lines[eachindex].split()[0], format='yday', scale='utc').cxcsec  for eachindex in time_stamped_line_indices]
-
-
-        # Now for each violation in the violations list, find the two indices
-        # between wich the violation must fall
-        for each_violation in violations_list:
-            # Find all the times in the event_times list that are LESS THAN OR
-            # EQUAL TO the violation time in question
-            leq_times = [index for index, etime in enumerate(event_times) if int(etime) <= each_violation['vio_time']]
-            # Now the last value in the leq_times list is the index into
-            # time_stamped_line_indices where you will obtain the location
-            # in the ALR list of where you want to indert the violation text
-            insert_loc = time_stamped_line_indices[leq_times[-1]]
-
-            # At long last you now know where to insert the violation text
-            # It's AFTER insert_loc
-            ALR_lines.insert(insert_loc, '\n')
-            ALR_lines.insert(insert_loc, 'ACISPKT AND/OR POWER COMMAND ERROR:\n')
-            ALR_lines.insert(insert_loc+1, str(each_violation['vio_date'])+' '+str(each_violation['vio_rule'])+'\n')
-
-            # Since you've added lines, you have to re-calculate the indices of all those
-            # lines which begin with a DOY time stamp again.
-            # This is the position of the stamped line in the ALR file.
-            time_stamped_line_indices = [index for index, eachline in enumerate(ALR_lines) if time_stamp.match(eachline)]
-
-        # So now you've updated the list of ALR lines to include any errors that exist.
-        # Write the list out to a new file
-        outfile = open(lr_file+'.ERRORS', 'w')
-        outfile.writelines(ALR_lines)
-        outfile.close()
-
-        # If the test flag was False, then move the .ERRORS file to ACIS-LoadReview.txt
-        # If it was True then we leave the original ACIS-LoadReview.txt and the
-        # ACIS-LoadReview.txt.ERRORS files intact for comparison.
+        # Read the load review text file and put the errors in among the lines
+        alr_doc = ALR_Document_Class.ALR_Document_Object(lr_file)
+        alr_doc.Add_Power_Command_Errors(violations_list)
+
+        # If the test flag was False, then replace ACIS-LoadReview.txt with the
+        # updated file in one step.
+        # If it was True then we leave the original ACIS-LoadReview.txt intact
+        # and write the updated file to ACIS-LoadReview.txt.ERRORS for comparison.
         if not self.test_flag:
             try:
-                print('      Moving ACIS-LoadReview.txt.ERRORS to ACIS-LoadReview.txt')
-                shutil.move('ACIS-LoadReview.txt.ERRORS', 'ACIS-LoadReview.txt')
+                print('      Writing the errors into ACIS-LoadReview.txt')
+                alr_doc.Write()
             except OSError as err:
                 print(err)
-                print('Examine the ofls directory and look for the .ERRORS file.')
+                print('ACIS-LoadReview.txt was left unchanged.')
             else:
                 print('      Copy of errors into ACIS-LoadReview.txt was successful')
         else:
+            alr_doc.Write('ERRORS')
             print('\nTEST MODE - Leaving the ACIS-LoadReview.txt and ACIS-LoadReview.txt.ERRORS files intact for comparison')
 
+    #---------------------------------------------------------------------------
+    #
+    # insert_errors_in_lines - Given the lines of an ACIS-LoadReview.txt file
+    #                          and a list of errors, insert a time stamped
+    #                          line for each error into the list of lines.
+    #
+    #---------------------------------------------------------------------------
+    def insert_errors_in_lines(self, ALR_lines, violations_list):
+        """
+        Same as insert_errors but works on a list of ACIS-LoadReview.txt
+        lines in memory instead of on the file. The error lines are
+        inserted into ALR_lines, which is also returned.
+
+        Each error goes just before the last time stamped line whose time,
+        truncated to the second, is at or before the time of the error.
+        Errors that go in the same place are kept in time order.
+
+        The placement is done by ALR_Document_Class.ALR_Document_Object,
+        which indexes the time stamps once and merges the errors into the
+        lines in one pass.
+        """
+        alr_doc = ALR_Document_Class.ALR_Document_Object(ALR_lines = ALR_lines)
+        alr_doc.Add_Power_Command_Errors(violations_list)
+
+        ALR_lines[:] = alr_doc.Merged_Lines()
+
+        return ALR_lines
@@ -42,6 +42,9 @@ import Backstop_File_Class
 # Bring in rule set which handles ACISPKT commands
 import Rulesets
 
+# Bring in the class which counts, and can trace, the rules fired
+import Rule_Trace_Class
+
 #-------------------------------------------------------------------------------
 #  Function: run_one_command - Run one command though the specified  rule set
 #                              until the system state does not change
@@ -49,12 +52,15 @@ import Rulesets
 #       Inputs:         cmd - the backstop command to be processed
 #              system_state - the present state of the system (class)
 #                   ruleset - the rule set functionto be used
+#                     trace - (optional) Rule_Trace_Object to record the
+#                             rules fired in
+#             command_index - row of cmd in the system packets array
 #
 #      Outputs: Final State
 #               violations list
 
 #-------------------------------------------------------------------------------
-def run_one_command(cmd, system_state, bfc, rule_set):
+def run_one_command(cmd, system_state, bfc, rule_set, trace = None, command_index = -1):
 
     # Init the empty list of rules fired in this call
     all_rules_fired = []
@@ -62,20 +68,34 @@ def run_one_command(cmd, system_state, bfc, rule_set):
     # Init an empty violations list
     violations_list = []
 
+    # The rules fired on this command, over all of the passes of the rule
+    # set: rule id -> delta t of its first firing. A rule which fires again
+    # on a later pass, because the state changed, is only counted once.
+    rules_fired_on_command = {}
+
     # Record the date of this command in system_state.state
     system_state.state['date_cmd'] = cmd['event_date']
     system_state.state['time_cmd'] = cmd['event_time']
 
-    # Save the present system state in last state.
-    last_state = dict(system_state.state)
+    # Save the present version of the system state. The version goes up
+    # whenever a rule changes one of the state values.
+    #
+    # The rule set is given system_state.state itself rather than a copy.
+    # That is only safe because rules read nothing from it but date_cmd and
+    # time_cmd - see "Rule set interface" in Rulesets.py.
+    last_version = system_state.state.version
 
     # Now run the rule set once and then check to see if the state changed.
     # REMEMBER - rules can have an impact on State.
 
     system_state, new_rules_fired, vio_list = rule_set(cmd,
-                                                       last_state,
+                                                       system_state.state,
                                                        system_state,
                                                        bfc)
+    # Note the rules that fired
+    for rule_id, delta_t in new_rules_fired:
+        rules_fired_on_command.setdefault(rule_id, delta_t)
+
     # Append all the rules that may have fired
     if new_rules_fired:
          all_rules_fired += new_rules_fired
@@ -85,14 +105,17 @@ def run_one_command(cmd, system_state, bfc, rule_set):
         violations_list.append(vio_list)
 
     # Keep on running the ACISPKT rules until the state does not change
-    while last_state != system_state.state:
-        # Set the last state to the present state
-        last_state = dict(system_state.state)
+    while last_version != system_state.state.version:
+        # Set the last version to the present version
+        last_version = system_state.state.version
         # Run the ACISPKT ruleset again
         system_state, new_rules_fired, vio_list = rule_set(cmd,
-                                                           last_state,
+                                                           system_state.state,
                                                            system_state,
                                                            bfc)
+        # Note the rules that fired
+        for rule_id, delta_t in new_rules_fired:
+            rules_fired_on_command.setdefault(rule_id, delta_t)
     # Append all the rules that may have fired
     if new_rules_fired:
          all_rules_fired += new_rules_fired
@@ -100,12 +123,193 @@ def run_one_command(cmd, system_state, bfc, rule_set):
     # Append any violations, that were detected, to the master list
     if vio_list:
         violations_list.append(vio_list)
+
+    # Count, once each, the rules that fired on this command
+    if rules_fired_on_command and (trace is not None):
+        trace.record_rules_fired(list(rules_fired_on_command.items()), command_index)
               
     # Return the important values
     return (system_state, all_rules_fired, violations_list)
     
 
 
+#-------------------------------------------------------------------------------
+#  Function: check_power_commands - Run the power command checks over an
+#                                   array of system packets
+#
+#       Inputs: commands_array - the system packets to be checked
+#                    alr_lines - (optional) list of ACIS-LoadReview.txt lines
+#                        trace - (optional) Rule_Trace_Object
+#                      alr_doc - (optional) ALR_Document_Object
+#
+#      Outputs: list of violations
+#-------------------------------------------------------------------------------
+def check_power_commands(commands_array, alr_lines = None, trace = None, alr_doc = None):
+    """
+    Check the spacing of the power commands in a load and return the
+    violations that were found.
+
+    Nothing is read from, or written to, the current directory, so this
+    can be called any number of times in one process.
+
+      Inputs: commands_array - The system packets of the load: the array
+                               made by Backstop_File_Object.strip_out_pertinent_packets
+                               or Backstop_File_Object.extract_pertinent_packets.
+                               Its timing_rules column is filled in.
+
+                   alr_lines - Optional list of the lines of the
+                               ACIS-LoadReview.txt file. If given, the
+                               error messages are inserted into the list.
+
+                       trace - Optional Rule_Trace_Object in which the rules
+                               fired are counted (and traced, if it is
+                               enabled). Pass one in to see the counts.
+
+                     alr_doc - Optional ALR_Document_Object shared with the
+                               other checks. If given, the error messages
+                               are added to it; it is up to the caller to
+                               Write it.
+
+     Outputs: The list of violations. Each is a dict, e.g.:
+
+                {'vio_date': '2018:065:21:40:36.53',
+                 'vio_time': 636759705,
+                 'vio_rule': 'Rule 3 - Less than 4 second delay'}
+    """
+    # Now create an instance of the the System State Class.
+    system_state = System_State_Class.System_State_Object()
+
+    # Create an instance of the Backstop_File_class. It holds the previous
+    # ACISPKT command.
+    bfc = Backstop_File_Class.Backstop_File_Object(True)
+
+    # If no trace was given, still count the rules fired but don't trace them
+    if trace is None:
+        trace = Rule_Trace_Class.Rule_Trace_Object(Rulesets.rule_names)
+
+    # List of all violations found.  If populated, this is a list of dictionaries
+    all_violations = []
+
+    # Nothing to check
+    if len(commands_array) == 0:
+        return all_violations
+
+    # Check the minimum delays between consecutive ACISPKT commands for the
+    # whole load at once. The results are reported as each command is processed.
+    system_packets = Rulesets.Evaluate_ACISPKT_Timing_Rules(commands_array)
+
+    violations_list = []
+
+    # Which is, of course, at row zero
+    array_row_number = 0
+
+    # Grab the first item in the array
+    present_cmd = system_packets[array_row_number]
+
+
+    # If this is a Vehicle-Only Review load then there will be no ACISPKT commands within the load.
+    # So skip the while loop which is intended to take you to the first one.  
+    # This means that array_row_number will equal 0
+
+    if 'ACISPKT' in system_packets['cmd_type']:
+
+        # 
+        # Now  process each entry until you hit your first ACISPKT.  
+        # Then you process that first one.  This will set up
+        # the system state for processing the next ACISPKT that you encounter
+        while present_cmd['cmd_type'] != 'ACISPKT':
+
+            # Run the ORB rules on the present state
+            system_state, new_rules_fired, violations_list = run_one_command(present_cmd,
+                                                                                 system_state,
+                                                                                 bfc,
+                                                                                 Rulesets.ORB_CMD_SW_rule_set,
+                                                                                 trace,
+                                                                                 array_row_number)
+      
+            # Append any violations you found to the master violations list
+            if violations_list:
+                all_violations.append(violations_list[0])
+
+            # You want to increment the system_packets index so that you can look
+            # at the next command.
+            # You will be looking at the next row
+            array_row_number += 1
+
+            # Now look at the next command in the backstop file.
+            present_cmd = system_packets[array_row_number]
+
+
+    # Ok so this next command you are looking at is an ACISPKT command.
+    # The first one you've ever seen. And you have not processed it yet.
+    #
+    # Save it so that any number of commands that are NOT ACISPKT commands
+    # that lie between this command and the next ACISPKT command do not
+    # interfere with checking the command timing. For example:
+    #
+    # ACISPKT command
+    # OORMPEN
+    # ACISPKT command
+
+    # Create a bogus first ACISPKT command so that the REAL first
+    # ACISPKT command rules can modify the state but not test any
+    # back to back ACISPKT command rules.
+    bfc.write_bogus_previous_ACISPKT_cmd(present_cmd)
+
+    # Start processing all the rest of the commands
+    # The first one will be an ACISPKT command because the loop
+    # above set that up.
+    for packet_index, eachpacket in enumerate(system_packets[array_row_number:], array_row_number):
+
+        # If this command is an ACISPKT command, run those rules
+        if eachpacket['cmd_type'] == 'ACISPKT':
+
+            # June 2019 change - first run the state rules...
+            system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
+                                                                             system_state,
+                                                                             bfc,
+                                                                             Rulesets.ACISPKT_State_rules,
+                                                                             trace,
+                                                                             packet_index)
+       
+            # ...now run the timing check rules.
+
+            system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
+                                                                             system_state,
+                                                                             bfc,
+                                                                             Rulesets.ACISPKT_rules,
+                                                                             trace,
+                                                                             packet_index)
+
+            # Store the command you are assessing as the previous command
+            bfc.write_previous_ACISPKT_cmd(eachpacket)
+                        
+        else: 
+            # Else it's not an ACISPKT so run the CMD/ORB rule set
+            system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
+                                                                             system_state,
+                                                                             bfc,
+                                                                             Rulesets.ORB_CMD_SW_rule_set,
+                                                                             trace,
+                                                                             packet_index)
+      
+
+
+        # Append any violations you found to the master violations list
+        if violations_list:
+            all_violations += violations_list[0]
+
+    # Put the errors into the ACIS-LoadReview.txt lines if they were given
+    if (alr_lines is not None) and (len(all_violations) > 0):
+        bfc.insert_errors_in_lines(alr_lines, all_violations)
+
+    # Add the errors to the shared ACIS-LoadReview.txt document if it was given
+    if alr_doc is not None:
+        alr_doc.Add_Power_Command_Errors(all_violations)
+
+    return all_violations
+
+
 # =======================  MAIN ==========================================
 #      Processing the command array
 # ========================================================================
@@ -155,158 +359,62 @@ python3 /data/acis/LoadReviews/script/CHECK_POWER_COMMANDS/Check_Power_Cmds.py
     If a violation of these rules is detected, the number of the rule 
     in the above list is included in  the violation message.
 
-    Last state is used to determine if it's fruitless to keep running a
-    rule set. Set it equal to the presetn state and then run some rules. 
-    Then you check to see if the state changed. If it did, keep running the rules.
-    If it did not, then stop.
+    The state version is used to determine if it's fruitless to keep running a
+    rule set. Note the version of the present state and then run some rules. 
+    Then you check to see if the version changed. If it did, the state changed
+    so keep running the rules. If it did not, then stop.
 """
-# Using ARGPARSE
-cl_parser = argparse.ArgumentParser(description='Check Power Commands program')
-
-# Add the TEST argument as NON-POSITIONAL.  
-cl_parser.add_argument("-t", '--test', help='In test mode, plots are not moved to htdocs', action="store_true")
-
-# Parse out the args
-testargs = cl_parser.parse_args()
-
-# Set the test flag based upon user input
-if testargs.test:
-    # For Test Purposes:
-    print('\n    Check_Power_Cmds -  RUNNING IN TEST MODE')
-    test_flag = True
-else:
-    test_flag = False
-
-# Now create an instance of the the System State Class.
-system_state = System_State_Class.System_State_Object()
-
-# Create an instance of the Backstop_File_class
-bfc = Backstop_File_Class.Backstop_File_Object(test_flag)
-
-# Capture the important commands from the Backstop file
-# First find the backstop file:
-backstop_file = glob.glob('CR*.backstop')[0]
-
-# The packets that we care about are stripped out of the backstop file
-# here.  These are the entities that will be analyzed
-system_packets = bfc.strip_out_pertinent_packets(backstop_file)
-
-# Create an empty list for rules firing history
-all_rules_fired = []
-
-# List of all violations found.  If populated, this is a list of dictionaries
-all_violations = []
-violations_list = []
+if __name__ == '__main__':
+    # Using ARGPARSE
+    cl_parser = argparse.ArgumentParser(description='Check Power Commands program')
 
-# Which is, of course, at row zero
-array_row_number = 0
+    # Add the TEST argument as NON-POSITIONAL.  
+    cl_parser.add_argument("-t", '--test', help='In test mode, plots are not moved to htdocs', action="store_true")
 
-# Grab the first item in the array
-present_cmd = system_packets[array_row_number]
+    # Add the PACKETS argument as NON-POSITIONAL.
+    cl_parser.add_argument("-p", '--packets', help='Write the extracted packets out to <backstop file>.ACISPKTs', action="store_true")
 
+    # Add the TRACE argument as NON-POSITIONAL.
+    cl_parser.add_argument('--trace', help='Write a trace of the rules fired to <backstop file>.rule_trace.npy', action="store_true")
 
-# If this is a Vehicle-Only Review load then there will be no ACISPKT commands within the load.
-# So skip the while loop which is intended to take you to the first one.  
-# This means that array_row_number will equal 0
+    # Parse out the args
+    testargs = cl_parser.parse_args()
 
-if 'ACISPKT' in system_packets['cmd_type']:
+    # Set the test flag based upon user input
+    if testargs.test:
+        # For Test Purposes:
+        print('\n    Check_Power_Cmds -  RUNNING IN TEST MODE')
+        test_flag = True
+    else:
+        test_flag = False
 
-    # 
-    # Now  process each entry until you hit your first ACISPKT.  
-    # Then you process that first one.  This will set up
-    # the system state for processing the next ACISPKT that you encounter
-    while present_cmd['cmd_type'] != 'ACISPKT':
+    # Create an instance of the Backstop_File_class
+    bfc = Backstop_File_Class.Backstop_File_Object(test_flag)
 
-        # Run the ORB rules on the present state
-        system_state, new_rules_fired, violations_list = run_one_command(present_cmd,
-                                                                             system_state,
-                                                                             bfc,
-                                                                             Rulesets.ORB_CMD_SW_rule_set)
-  
-        # Append all the rules that may have fired to the master rule list
-        if new_rules_fired:
-            all_rules_fired.append(list(new_rules_fired))
- 
-        # Append any violations you found to the master violations list
-        if violations_list:
-            all_violations.append(violations_list[0])
-
-        # You want to increment the system_packets index so that you can look
-        # at the next command.
-        # You will be looking at the next row
-        array_row_number += 1
-
-        # Now look at the next command in the backstop file.
-        present_cmd = system_packets[array_row_number]
-
-
-# Ok so this next command you are looking at is an ACISPKT command.
-# The first one you've ever seen. And you have not processed it yet.
-#
-# Save it so that any number of commands that are NOT ACISPKT commands
-# that lie between this command and the next ACISPKT command do not
-# interfere with checking the command timing. For example:
-#
-# ACISPKT command
-# OORMPEN
-# ACISPKT command
-
-# Create a bogus first ACISPKT command so that the REAL first
-# ACISPKT command rules can modify the state but not test any
-# back to back ACISPKT command rules.
-bfc.write_bogus_previous_ACISPKT_cmd(present_cmd)
-
-# Start processing all the rest of the commands
-# The first one will be an ACISPKT command because the loop
-# above set that up.
-# for eachpacket in system_packets[array_row_number+1:125]:
-for eachpacket in system_packets[array_row_number:]:
-    new_rules_fired = []
-
-    # If this command is an ACISPKT command, run those rules
-    if eachpacket['cmd_type'] == 'ACISPKT':
-
-        # June 2019 change - first run the state rules...
-        system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
-                                                                         system_state,
-                                                                         bfc,
-                                                                         Rulesets.ACISPKT_State_rules)
-   
-        # ...now run the timing check rules.
-
-        system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
-                                                                         system_state,
-                                                                         bfc,
-                                                                         Rulesets.ACISPKT_rules)
-
-        # Store the command you are assessing as the previous command
-        bfc.write_previous_ACISPKT_cmd(eachpacket)
-                    
-    else: 
-        # Else it's not an ACISPKT so run the CMD/ORB rule set
-        system_state, new_rules_fired, violations_list = run_one_command(eachpacket,
-                                                                         system_state,
-                                                                         bfc,
-                                                                         Rulesets.ORB_CMD_SW_rule_set)
-  
-
-
-    # Append all the rules that may have fired
-    if new_rules_fired:
-        all_rules_fired.append(list(new_rules_fired))
- 
-    # Append any violations you found to the master violations list
-    if violations_list:
-        all_violations += violations_list[0]
+    # Capture the important commands from the Backstop file
+    # First find the backstop file:
+    backstop_file = glob.glob('CR*.backstop')[0]
 
+    # The packets that we care about are stripped out of the backstop file
+    # here.  These are the entities that will be analyzed
+    system_packets = bfc.strip_out_pertinent_packets(backstop_file, testargs.packets)
 
-if len(all_violations) == 0:
-    print('\n    NO POWER COMMAND ERRORS FOUND\n')
-else:
-    # Write out the errors
-    print('\n    ERROR - POWER COMMAND ERRORS FOUND!')
-    bfc.insert_errors('ACIS-LoadReview.txt', all_violations)
+    # Count, and if asked to trace, the rules fired
+    trace = Rule_Trace_Class.Rule_Trace_Object(Rulesets.rule_names, testargs.trace)
 
+    # Run the checks
+    all_violations = check_power_commands(system_packets, trace = trace)
 
+    # Report how often each rule fired
+    trace.print_rule_counts()
 
+    if testargs.trace:
+        print('\n    Writing the rule trace to', backstop_file+'.rule_trace.npy')
+        trace.write_trace(backstop_file+'.rule_trace.npy')
 
+    if len(all_violations) == 0:
+        print('\n    NO POWER COMMAND ERRORS FOUND\n')
+    else:
+        # Write out the errors
+        print('\n    ERROR - POWER COMMAND ERRORS FOUND!')
+        bfc.insert_errors('ACIS-LoadReview.txt', all_violations)
@@ -0,0 +1,110 @@
+################################################################################
+#
+#  Rule_Trace_Class - class defined to keep track of the rules fired while
+#                     checking the power commands in a load.
+#
+#                     A count of the firings of each rule is always kept.
+#                     A trace of every firing - which rule, at which
+#                     command, and the delta t the rule tested - is only
+#                     kept when asked for, for debugging.
+#
+################################################################################
+import numpy as np
+
+class Rule_Trace_Object:
+    """
+    Class defined to keep track of the rules fired while
+    checking the power commands in a load.
+
+    rule_counts[rule id] is the number of commands that rule fired on. These
+    are always kept; counting costs next to nothing.
+
+    If enabled is True, each firing is also recorded in the trace
+    array, which has the columns:
+
+        rule          - the rule id (see Rulesets.rule_names)
+        command_index - row, in the system packets array, of the
+                        command being processed
+        delta_t       - the time, in seconds, that the rule tested
+
+    A rule set is run again on a command whenever the state changes, so
+    a rule can fire on more than one pass over the same command.
+    Check_Power_Cmds.run_one_command records each rule at most once per
+    command, so rule_counts[rule id] is the number of commands on which
+    the rule fired.
+    """
+    def __init__(self, rule_names, enabled = False):
+        self.rule_names = rule_names
+        self.enabled = enabled
+
+        self.rule_counts = np.zeros(len(rule_names), dtype = np.int64)
+
+        # The trace array is allocated in blocks and grown as needed.
+        # Only the first num_traced rows are in use.
+        self.trace_dtype = [('rule', '<i2'), ('command_index', '<i4'), ('delta_t', '<f8')]
+        self.trace = np.zeros(1024 if enabled else 0, dtype = self.trace_dtype)
+        self.num_traced = 0
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: record_rules_fired - Count, and if enabled trace, the rules
+    #                              fired by one rule set call
+    #
+    #---------------------------------------------------------------------------
+    def record_rules_fired(self, rules_fired, command_index):
+        """
+        Given the list of (rule id, delta t) of the rules which fired on
+        one command, each rule listed once, and the row of the command in
+        the system packets array, count each rule and, if the trace is
+        enabled, add it to the trace.
+        """
+        for rule_id, delta_t in rules_fired:
+            self.rule_counts[rule_id] += 1
+
+            if self.enabled:
+                # Double the size of the trace array when it fills up
+                if self.num_traced == len(self.trace):
+                    self.trace = np.concatenate((self.trace, np.zeros(len(self.trace), dtype = self.trace_dtype)))
+
+                self.trace[self.num_traced] = (rule_id, command_index, delta_t)
+                self.num_traced += 1
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: get_trace - Return the rules traced so far
+    #
+    #---------------------------------------------------------------------------
+    def get_trace(self):
+        """
+        Return the part of the trace array in use. It is empty if the
+        trace was not enabled.
+        """
+        return self.trace[:self.num_traced]
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: write_trace - Save the trace in a numpy .npy file
+    #
+    #---------------------------------------------------------------------------
+    def write_trace(self, trace_file):
+        """
+        Save the trace to trace_file, which should end in .npy. Read it
+        back with numpy.load.
+        """
+        np.save(trace_file, self.get_trace())
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: print_rule_counts - Print the number of commands each rule fired on
+    #
+    #---------------------------------------------------------------------------
+    def print_rule_counts(self):
+        """
+        Print the number of commands on which each rule fired, leaving
+        out the rules which never fired.
+        """
+        print('\n    Rules fired (number of commands):')
+
+        for rule_id, count in enumerate(self.rule_counts):
+            if count > 0:
+                print('%10d  %s' % (count, self.rule_names[rule_id]))
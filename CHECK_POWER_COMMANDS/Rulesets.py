@@ -3,6 +3,199 @@
 #  Rulesets.py - sets of rules used to check power commands in weekly loads.
 #
 ################################################################################
+import numpy as np
+
+#-------------------------------------------------------------------------------
+#
+#    Rule set interface - Every rule set is called by
+#                         Check_Power_Cmds.run_one_command as:
+#
+#        rule_set(cmd_entry, command_state, system_state, bfc)
+#
+#    and returns (system_state, rules_fired, violations_list).
+#
+#    command_state (called ACISPKT_state or last_state below) is
+#    system_state.state itself, NOT a copy taken before the rule set ran.
+#    run_one_command sets its date_cmd and time_cmd to the date and time of
+#    the command being processed before calling the rule set, and no rule
+#    changes them. Those two entries are the ONLY ones a rule may read from
+#    command_state.
+#
+#    Every other entry must be read, and written, through
+#    system_state.state. A rule which read any other entry from
+#    command_state, expecting the value from before the rule set ran, would
+#    instead see whatever the rules before it in the same call had already
+#    changed, and its result would depend on the order of the rules. If a
+#    rule ever needs the state from before the call, take a copy in
+#    run_one_command and pass that in.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+#
+#    Rule ids - Each rule appends (rule id, delta t) to its rules_fired list
+#               when it fires. The id is an index into rule_names.
+#               Check_Power_Cmds counts the firings of each rule and, if
+#               asked to, keeps a trace of them (see Rule_Trace_Class).
+#
+#               delta t is the time, in seconds, that the rule tested, or
+#               0.0 for rules which don't test a time.
+#
+#-------------------------------------------------------------------------------
+STATE_RULE_0 = 0
+STATE_RULE_1 = 1
+STATE_RULE_2 = 2
+STATE_RULE_3 = 3
+STATE_RULE_4 = 4
+ACISPKT_RULE_0 = 5
+ACISPKT_RULE_1 = 6
+ACISPKT_RULE_2 = 7
+ACISPKT_RULE_3 = 8
+ACISPKT_RULE_4 = 9
+ACISPKT_RULE_5 = 10
+ORB_CMD_SW_RULE_1 = 11
+ORB_CMD_SW_RULE_2 = 12
+ORB_CMD_SW_RULE_3 = 13
+
+rule_names = ['STATE Rule 0 - First Stop_science at load start',
+              'STATE Rule 1 - Start_science',
+              'STATE Rule 2 - First Stop_science',
+              'STATE Rule 3 - WSPOW0002A executed',
+              'STATE Rule 4 - A Power command has brought some FEPs up',
+              'ACISPKT Rule 0 - Less than 4 second delay between consecutive ACISPKT commands',
+              'ACISPKT Rule 1 - Less than 3 min delay between first AA00 and WSPOW',
+              'ACISPKT Rule 2 - Verified 3 min delay between AA00 and WSPOW',
+              'ACISPKT Rule 3 - Less than 24 seconds between WSPOW0 and next ACISPKT',
+              'ACISPKT Rule 4 - Less than 18 sec between WSVIDALLDN and the next ACIS Command',
+              'ACISPKT Rule 5 - Less than 63 seconds between WSPOW power-up and next ACIS command',
+              'ORB/CMD Rule 1 - INBOUND OORMPDS or EEF1000',
+              'ORB/CMD Rule 2 - OUTBOUND',
+              'ORB/CMD_SW Rule 3 - Exiting Perigee Passage']
+
+#-------------------------------------------------------------------------------
+#
+#    ACISPKT timing rule table - minimum delays between an ACISPKT command
+#                                and the ACISPKT command that follows it.
+#
+#    Each entry gives:
+#
+#        rule      - The rule number used in the messages
+#        previous  - Which of the previous ACISPKT commands the rule applies to
+#        next      - Which of the following ACISPKT commands the rule applies to
+#        min_delay - The minimum delay, in seconds, between the two
+#        vio_rule  - The violation message
+#        rule_id   - The id recorded in rules_fired
+#
+#    previous and next are given the whole column of previous (or following)
+#    commands and return a boolean array.
+#
+#    The table is evaluated over the entire array of system packets, in one
+#    go, by Evaluate_ACISPKT_Timing_Rules. The delay is rounded to the
+#    nearest second before it is compared with min_delay.
+#
+#-------------------------------------------------------------------------------
+def Any_Command(commands):
+    """
+    Timing rule predicate which accepts every command
+    """
+    return np.ones(len(commands), dtype = bool)
+
+def Is_ACISPKT(commands):
+    """
+    Timing rule predicate which accepts ACISPKT commands
+    """
+    return commands['cmd_type'] == 'ACISPKT'
+
+def Is_WSPOW00000(commands):
+    """
+    Timing rule predicate which accepts the WSPOW00000 (power down) command
+    """
+    return commands['packet_or_cmd'] == 'WSPOW00000'
+
+def Is_WSVIDALLDN(commands):
+    """
+    Timing rule predicate which accepts the WSVIDALLDN command
+    """
+    return commands['packet_or_cmd'] == 'WSVIDALLDN'
+
+def Is_Power_Up(commands):
+    """
+    Timing rule predicate which accepts WSPOW commands other than WSPOW00000
+    """
+    return np.char.startswith(commands['packet_or_cmd'], 'WSPOW') & (commands['packet_or_cmd'] != 'WSPOW00000')
+
+ACISPKT_timing_rules = [
+    {'rule': 0,
+     'previous': Is_ACISPKT,
+     'next': Is_ACISPKT,
+     'min_delay': 4.0,
+     'vio_rule': 'ACISPKT Rule #0 - ERROR Less than 4 second delay between consecutive ACISPKT commands',
+     'rule_id': ACISPKT_RULE_0},
+
+    {'rule': 3,
+     'previous': Is_WSPOW00000,
+     'next': Any_Command,
+     'min_delay': 24.0,
+     'vio_rule': 'ACISPKT Rule #3 - ERROR  Less than 24 seconds between WSPOW0 and next ACISPKT',
+     'rule_id': ACISPKT_RULE_3},
+
+    {'rule': 4,
+     'previous': Is_WSVIDALLDN,
+     'next': Any_Command,
+     'min_delay': 18.0,
+     'vio_rule': 'ACISPKT Rule #4 -  ERROR 18 sec required between WSVIDALLDN and the next ACIS Command.',
+     'rule_id': ACISPKT_RULE_4},
+
+    {'rule': 5,
+     'previous': Is_Power_Up,
+     'next': Is_ACISPKT,
+     'min_delay': 63.0,
+     'vio_rule': 'ACISPKT Rule #5 - ERROR Less than 63 seconds between WSPOW power-up and next ACIS command',
+     'rule_id': ACISPKT_RULE_5}]
+
+#-------------------------------------------------------------------------------
+#
+#    Evaluate_ACISPKT_Timing_Rules - Evaluate the timing rule table over every
+#                                    pair of consecutive ACISPKT commands
+#
+#    input:  The system packets array made by
+#            Backstop_File_Object.strip_out_pertinent_packets
+#
+#   output:  The same array with the timing_rules column filled in
+#
+#-------------------------------------------------------------------------------
+def Evaluate_ACISPKT_Timing_Rules(system_packets):
+    """
+    For each ACISPKT command, work out which of the rules in
+    ACISPKT_timing_rules it breaks with respect to the ACISPKT command
+    before it. Commands of other types in between are skipped over, just
+    as they are by bfc.previous_ACISPKT_cmd.
+
+    Bit N of the timing_rules column is set if the command breaks entry N
+    of the table. The first ACISPKT command has no previous command, so it
+    can't break any of them.
+
+    ACISPKT_rules reads the column to report the violations.
+    """
+    system_packets['timing_rules'] = 0
+
+    # Row numbers of the ACISPKT commands
+    ACISPKT_rows = np.nonzero(system_packets['cmd_type'] == 'ACISPKT')[0]
+
+    # Each ACISPKT command after the first, the one before it, and the
+    # delay between them rounded to the nearest second
+    previous_cmds = system_packets[ACISPKT_rows[:-1]]
+    next_cmds = system_packets[ACISPKT_rows[1:]]
+    delays = np.round(np.diff(system_packets['event_time'][ACISPKT_rows]), 0)
+
+    for bit, each_rule in enumerate(ACISPKT_timing_rules):
+        broken = each_rule['previous'](previous_cmds) & \
+                 each_rule['next'](next_cmds) & \
+                 (delays < each_rule['min_delay'])
+
+        system_packets['timing_rules'][ACISPKT_rows[1:][broken]] |= (1 << bit)
+
+    return system_packets
 
 #-------------------------------------------------------------------------------
 #
@@ -17,7 +210,7 @@
 #            The backstop file class instance
 #            
 #   output:  Updated state dictionary
-#            List of rules fired
+#            List of (rule id, delta t) of the rules fired
 #
 # Update: June 26, 2019
 #         VERSION 1.3
@@ -81,7 +274,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['some_FEPs_up_date'] = 'unk'
         system_state.state['some_FEPs_up_time'] = 0
         # Record that this Rule fired.
-        rules_fired.append('STATE Rule 0 - First Stop_science at load start '+system_state.state['science_run_start_date'])
+        rules_fired.append((STATE_RULE_0, 0.0))
 
     # RULE 1 - START SCIENCE - Mark the start of a science run
     if (cmd_entry['packet_or_cmd'] in start_science_packets) and \
@@ -95,7 +288,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['post_sci_run_power_down'] = False
         system_state.state['post_sci_run_power_down_date'] = 'unk'
         system_state.state['post_sci_run_power_down_time'] = 0
-        rules_fired.append('STATE Rule 1 - Start_science '+system_state.state['science_run_start_date'])
+        rules_fired.append((STATE_RULE_1, 0.0))
 
     # RULE 2 - STOP SCIENCE - And you KNOW a science run was begun - Mark the end of the science run
     if (cmd_entry['packet_or_cmd'] == stop_science_packet) and \
@@ -119,7 +312,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['some_FEPs_up_date'] = 'unk'
         system_state.state['some_FEPs_up_time'] = 0
        # Record that this Rule fired.
-        rules_fired.append('STATE Rule 2 - First Stop_science: '+system_state.state['science_run_stop_date'])
+        rules_fired.append((STATE_RULE_2, 0.0))
 
     # RULE 3 - Check to see if this is an WSPOW0002A command
     # IF   If You've stopped the science run, and
@@ -136,7 +329,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['three_FEPs_up_time'] = cmd_entry['event_time']
 
         # Record which rule fired
-        rules_fired.append('STATE Rule #3 -WSPOW0002A executed at: '+ cmd_entry['event_date'])
+        rules_fired.append((STATE_RULE_3, 0.0))
 
 
     # RULE 4 - If a WSPOW command is issued, and
@@ -151,7 +344,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['some_FEPs_up_date'] = cmd_entry['event_date']
         system_state.state['some_FEPs_up_time'] = cmd_entry['event_time']
         # Record which rule fired
-        rules_fired.append('STATE Rule #4 - A Power command has brought some FEPs up')
+        rules_fired.append((STATE_RULE_4, 0.0))
     # Return the state and the rules fired list
     return ( system_state, rules_fired, violations_list)
 
@@ -165,7 +358,7 @@ def ACISPKT_State_rules(cmd_entry, ACISPKT_state, system_state, bfc):
 #            The ACISPKT state dictionary
 #            
 #   output:  Updated state dictionary
-#            List of rules fired
+#            List of (rule id, delta t) of the rules fired
 #
 #-------------------------------------------------------------------------------
 def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
@@ -176,6 +369,11 @@ def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
     determine if a timing rule has been violated. If so, record the error 
     in violations_list.
 
+    The fixed minimum delays (Rules 0, 3, 4 and 5) are in
+    ACISPKT_timing_rules. Evaluate_ACISPKT_Timing_Rules must have been
+    run over the system packets first; this routine reports what it found.
+    Rules 1 and 2 depend on the system state and are checked here.
+
     When you are finished processing the command, it will be copied into 
     System_State_Class.previous_ACISPKT. That way you'll be able to calculate the time
     differential between two, consecutive ACISPKT commands.
@@ -203,19 +401,17 @@ def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
    
     # Ok now it's time to start checking things out. 
 
-    # rule 0 - Do you at least have the 4 second delay between any two
-    #          consecutive ACIPKT commands.
-    if cmd_entry['cmd_type'] == 'ACISPKT' and \
-       bfc.previous_ACISPKT_cmd['cmd_type'] == 'ACISPKT' and \
-       round(cmd_entry['event_time'] - bfc.previous_ACISPKT_cmd['event_time'], 0) < 4.0:
-        # Less than 4 seconds between consecutive ACISPKTS
-        # Append the vioolation
-        violation['vio_date'] =  ACISPKT_state['date_cmd']
-        violation['vio_time'] =  ACISPKT_state['time_cmd']
-        violation['vio_rule'] = 'ACISPKT Rule #0 - ERROR Less than 4 second delay between consecutive ACISPKT commands'
-        violations_list.append(violation)
-        # Record which rule fired
-        rules_fired.append('ACISPKT Rule 0 - 4 second delay: '+str(ACISPKT_state['date_cmd'])+str(cmd_entry['event_time'] - ACISPKT_state['time_cmd']))
+    # Rules 0, 3, 4 and 5 - The minimum delays between this ACISPKT command
+    # and the previous one. These are in ACISPKT_timing_rules and have
+    # already been checked for every command by Evaluate_ACISPKT_Timing_Rules.
+    # Report the ones this command breaks.
+    for bit, each_rule in enumerate(ACISPKT_timing_rules):
+        if cmd_entry['timing_rules'] & (1 << bit):
+            violations_list.append({'vio_date': ACISPKT_state['date_cmd'],
+                                    'vio_time': ACISPKT_state['time_cmd'],
+                                    'vio_rule': each_rule['vio_rule']})
+            # Record which rule fired and the delay it found
+            rules_fired.append((each_rule['rule_id'], cmd_entry['event_time'] - bfc.previous_ACISPKT_cmd['event_time']))
 
 
     # Rule 1 - FAILED 3 minute Rule First WSPOW00000 (or 02A)after the stop science
@@ -237,7 +433,7 @@ def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
 
         violations_list.append(violation) 
         # Record which rule fired
-        rules_fired.append('ACISPKT Rule #1 - ERROR LESS THAN 3 min delay between first AA00 and WSPOW')
+        rules_fired.append((ACISPKT_RULE_1, cmd_entry['event_time'] - system_state.state['science_run_stop_time']))
      
     # Rule 2 - SUCCEED 3 minute Rule First WSPOW00000 (or 02A)after the stop science
     if (system_state.state['science_run_exec'] == 'Stopped') and \
@@ -249,53 +445,9 @@ def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
         system_state.state['post_sci_run_power_down_date'] = cmd_entry['event_date']
         system_state.state['post_sci_run_power_down_time'] = cmd_entry['event_time']
         # Record which rule fired
-        rules_fired.append('ACISPKT Rule 2 - Verified 3 min delay between AA00 and WSPOW. PKT or CMD: '+str(cmd_entry['packet_or_cmd'])+' power_down_date is: '+cmd_entry['event_date']+ ' Delta T is: '+ str(cmd_entry['event_time'] - system_state.state['science_run_stop_time'])+ ' seconds. 180 seconds required')
+        rules_fired.append((ACISPKT_RULE_2, cmd_entry['event_time'] - system_state.state['science_run_stop_time']))
  
 
-    # RULE 3 - Check if there was at least 24 seconds between WSPOW00000 and any other ACIS command
-    # 
-    if bfc.previous_ACISPKT_cmd['packet_or_cmd'] == 'WSPOW00000' and \
-       round(cmd_entry['event_time'] - bfc.previous_ACISPKT_cmd['event_time'],0) < 24.0:
-        # THEN Record the violation
-        violation['vio_date'] =  str(ACISPKT_state['date_cmd'])
-        violation['vio_time'] =  ACISPKT_state['time_cmd']
-        violation['vio_rule'] = 'ACISPKT Rule #3 - ERROR  Less than 24 seconds between WSPOW0 and next ACISPKT'
-        violations_list.append(violation)
-        # Record which rule fired
-        rules_fired.append('ACISPKT Rule #3 - ERROR Less than 24 seconds between WSPOW0 and next ACISPKT')
-
-
-
-    # RULE 4 - WSVIDALLDN rule - has to be at least 18 seconds between WSVIDALLDN and any other ACIS command
-    # 
-    if bfc.previous_ACISPKT_cmd['packet_or_cmd'] == 'WSVIDALLDN' and \
-       round(cmd_entry['event_time'] - bfc.previous_ACISPKT_cmd['event_time'], 0) < 18.0:
-        # THEN Record the violation
-        violation['vio_date'] = ACISPKT_state['date_cmd']
-        violation['vio_time'] =  ACISPKT_state['time_cmd']
-        violation['vio_rule'] = 'ACISPKT Rule #4 -  ERROR 18 sec required between WSVIDALLDN and the next ACIS Command.'
-        # Append this violation to the list of all violations this pass
-        violations_list.append(violation)
-        # Record which rule fired
-        rules_fired.append('ACISPKT Rule #4 - ERROR 18 sec required between WSVIDALLDN and the next ACIS Command.')
-
-
-    # RULE 5 - If there was at least 63 seconds between WSPOW-type POWER UP commands
-    # 
-    if bfc.previous_ACISPKT_cmd['packet_or_cmd'][:5] == 'WSPOW' and \
-       bfc.previous_ACISPKT_cmd['packet_or_cmd'] != 'WSPOW00000' and \
-       cmd_entry['cmd_type'] == 'ACISPKT' and \
-       round((cmd_entry['event_time'] - bfc.previous_ACISPKT_cmd['event_time']),0) < 63.0:
-        # THEN Record the violation
-        violation['vio_date'] = ACISPKT_state['date_cmd']
-        violation['vio_time'] =  ACISPKT_state['time_cmd']
-        violation['vio_rule'] = 'ACISPKT Rule #5 - ERROR Less than 63 seconds between WSPOW power-up and next ACIS command'
-        violations_list.append(violation)
-
-        # Record which rule fired
-        rules_fired.append('ACISPKT Rule #5 - ERROR Less than 63 seconds between WSPOW power-up and next ACIS command')
-
-
     # Return the state and the rules fired list
     return ( system_state, rules_fired, violations_list)
 
@@ -310,7 +462,7 @@ def ACISPKT_rules(cmd_entry, ACISPKT_state, system_state, bfc):
 #            The state dictionary
 #
 #   output:  Updated state dictionary
-#            List of rules fired
+#            List of (rule id, delta t) of the rules fired
 #
 #-------------------------------------------------------------------------------
 def ORB_CMD_SW_rule_set(cmd_entry, last_state, present_state, bfc):
@@ -350,7 +502,7 @@ def ORB_CMD_SW_rule_set(cmd_entry, last_state, present_state, bfc):
         # You are in the inbound portion of the perigee passage - 
         # the part prior to Perigee.  Record that system_state
         present_state.state['perigee_passage'] = 'inbound'
-        rules_fired.append('ORB/CMD Rule 1 - INBOUND OORMPDS or EEF1000'+ cmd_entry['event_date'])
+        rules_fired.append((ORB_CMD_SW_RULE_1, 0.0))
 
     # Rule 2 - Check to see if this entry tells you that
     # you are in the inbound portion of the perigee passage
@@ -359,7 +511,7 @@ def ORB_CMD_SW_rule_set(cmd_entry, last_state, present_state, bfc):
         # the part after Perigee.  Record that system_state
         present_state.state['science_run_exec'] = False
         present_state.state['perigee_passage'] = 'outbound'
-        rules_fired.append('ORB/CMD Rule 2 - OUTBOUND '+ cmd_entry['event_date'])
+        rules_fired.append((ORB_CMD_SW_RULE_2, 0.0))
   
     # Rule 3 - If this command is a RADMON ENABLE then
     # you are EXITING the perigee passage
@@ -368,7 +520,7 @@ def ORB_CMD_SW_rule_set(cmd_entry, last_state, present_state, bfc):
         # Record that system_state
         present_state.state['science_run_exec'] = False
         present_state.state['perigee_passage'] = False
-        rules_fired.append('ORB/CMD_SW Rule 3 - Exiting Perigee Passage'+ cmd_entry['event_date'])
+        rules_fired.append((ORB_CMD_SW_RULE_3, 0.0))
  
 
     # Return the system_state and the rules fired list
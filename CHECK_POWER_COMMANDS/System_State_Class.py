@@ -26,6 +26,32 @@
 #
 #################################################################################
 
+class State_Dictionary(dict):
+    """
+    Dictionary used to hold the system state.
+
+    It works like any other dictionary except that it keeps a count, in
+    version, of the number of times an entry has been changed. Setting an
+    entry to the value it already has does not count.
+
+    So to find out whether running a rule set changed the state, you only
+    need to compare version before and after, rather than taking a copy
+    of the whole dictionary and comparing the two.
+
+    Only state['key'] = value is counted, which is how the rule sets
+    change the state.
+    """
+    __slots__ = ('version',)
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        if (key not in self) or (self[key] != value):
+            self.version += 1
+        dict.__setitem__(self, key, value)
+
 class System_State_Object:
     """
     Class defined to manage the state of the system.
@@ -39,8 +65,9 @@ class System_State_Object:
     """
     def __init__(self, ):
 
-        # System state dictionary
-        self.state = {'date_cmd':  '',
+        # System state dictionary. state.version goes up each time
+        # one of the values changes.
+        self.state = State_Dictionary({'date_cmd':  '',
                       'time_cmd': 0,
                       # Science Run status
                       'science_run_exec': 'unk',
@@ -65,7 +92,7 @@ class System_State_Object:
                       'some_FEPs_up': False,
                       'some_FEPs_up_date': 'unk',
                       'some_FEPs_up_time': 0,
-                     } # End of state Dictionary definition
+                     }) # End of state Dictionary definition
 
  
     #---------------------------------------------------------------------------
@@ -47,8 +47,16 @@ from backstop_history import BackstopHistory
 # ACIS Ops Imports
 import apt_date_secs as apt
 import Calc_Delta as cd
+import Command_Event_Codes as cec
 import ORP_File_Class as ofc
 
+# Keep astropy from going to the network for IERS or leap second data.
+# apt_date_secs configures astropy itself, but only when it first needs it.
+# backstop_history converts times with astropy directly, so astropy has to
+# be configured here, before backstop_history is used.
+import Time_Configuration
+Time_Configuration.Configure_Astropy()
+
 #
 # Parse the input arguments
 #
@@ -127,9 +135,13 @@ print('\nThis is the Continuity Load:')
 # Initialize the flag which will indicate when the review load output has begun
 review_load_started_flag = False
 
+# Classify every command in the assembled history, once, into the event
+# it represents
+event_codes = cec.Classify_Commands(assembled_commands['commands'])
+
 # Walk through the assembled history of commands and set dates and flags whenever
 # you read a command or event that we need to note.
-for each_cmd in assembled_commands:
+for each_cmd, event_code in zip(assembled_commands, event_codes):
 
     # If the date of this command is after the Review Load ToFC, then 
     # print a line out that delineates Continuity load deadman reports from
@@ -145,36 +157,36 @@ for each_cmd in assembled_commands:
     # set that component's date, time and flag. For SCS155 enable and activate
     # commands print out the execution time of the command for the load
     # reviewer.
-    if 'COENAS1=155' in each_cmd['commands']:
+    if event_code == cec.SCS155_ENABLE:
         COENAS1_date = each_cmd['date']
         COENAS1_time = each_cmd['time']
         scs_155_en = True
         COENAS1_acq = True
         print('     '+each_cmd['date']+'      SCS 155 Enable COENAS1')
 
-    elif 'COACTS1=155' in each_cmd['commands']:
+    elif event_code == cec.SCS155_ACTIVATE:
         COACTS1_date = each_cmd['date']
         COACTS1_time = each_cmd['time']
         scs_155_act=True
         COACTS1_acq = True
         print('     '+each_cmd['date']+'      SCS 155 Activate COACTS1')
 
-    elif 'EQF013M' in each_cmd['commands']:
+    elif event_code == cec.EQF013M:
         EQF013M_date = each_cmd['date']
         eqf013m_acq = True
 
-    elif 'EEF1000' in each_cmd['commands']:
+    elif event_code == cec.EEF1000:
         EEF1000_date = each_cmd['date']
         eef1000_acq = True
 
-    elif 'CODISAS1=155' in each_cmd['commands']:
+    elif event_code == cec.SCS155_DISABLE:
         CODISAS1_date = each_cmd['date']
         CODISAS1_time = each_cmd['time']
         scs_155_disa = True
         CODISAS1_acq = True
 
     # If the event is EPERIGEE
-    elif 'EPERIGEE' in each_cmd['commands']:
+    elif event_code == cec.EPERIGEE:
         print('     '+each_cmd['date']+'      EPERIGEE')
         # Check to see if you got all three commands required to manage
         # SCS-155 handling.  If you got here and you didn't then one
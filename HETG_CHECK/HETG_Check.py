@@ -49,9 +49,17 @@ from backstop_history import BackstopHistory
 # ACIS Ops Imports
 import apt_date_secs as apt
 import Calc_Delta as cd
+import Command_Event_Codes as cec
 import ORP_File_Class as ofc
 import OFLS_File_Utilities as oflsu
 
+# Keep astropy from going to the network for IERS or leap second data.
+# apt_date_secs configures astropy itself, but only when it first needs it.
+# backstop_history converts times with astropy directly, so astropy has to
+# be configured here, before backstop_history is used.
+import Time_Configuration
+Time_Configuration.Configure_Astropy()
+
 #
 # Parse the input arguments
 #
@@ -142,9 +150,13 @@ print('\n HETG Check for load week: ', load_week)
 # Initialize the flag which will indicate when the review load output has begun
 review_load_started_flag = False
 
+# Classify every command in the assembled history, once, into the event
+# it represents
+event_codes = cec.Classify_Commands(assembled_commands['commands'])
+
 # Walk through the assembled history of commands and set dates and flags whenever
 # you read a command or event that we need to note.
-for each_cmd in assembled_commands:
+for each_cmd, event_code in zip(assembled_commands, event_codes):
 
     # If the date of this command is after the Review Load ToFC, then 
     # print a line out that delineates Continuity load HETG reports from
@@ -160,7 +172,7 @@ for each_cmd in assembled_commands:
     # set that component's date, time and flag. For HETG insert and retract
     # commands print out the execution time of the command for the load
     # reviewer.
-    if 'MSID= 4OHETGIN' in each_cmd['commands']:
+    if event_code == cec.HETG_INSERT:
         HETG_in_date = each_cmd['date']
         HETG_in_time = each_cmd['time']
         hetg_in = True
@@ -168,7 +180,7 @@ for each_cmd in assembled_commands:
         HETG_status = 'IN'
         print('     '+each_cmd['date']+'      HETG INSERTED')
 
-    elif 'MSID= 4OHETGRE' in each_cmd['commands']:
+    elif event_code == cec.HETG_RETRACT:
         HETG_out_date = each_cmd['date']
         HETG_out_time = each_cmd['time']
         hetg_out = True
@@ -176,24 +188,24 @@ for each_cmd in assembled_commands:
         HETG_status = 'OUT'
         print('     '+each_cmd['date']+'      HETG RETRACTED')
 
-    elif 'EQF013M' in each_cmd['commands']:
+    elif event_code == cec.EQF013M:
         EQF013M_date = each_cmd['date']
         eqf013m_acq = True
 
-    elif 'EEF1000' in each_cmd['commands']:
+    elif event_code == cec.EEF1000:
         EEF1000_date = each_cmd['date']
         eef1000_acq = True
 
-    elif 'XQF013M' in each_cmd['commands']:
+    elif event_code == cec.XQF013M:
         XQF013M_date = each_cmd['date']
         xqf013m_acq = True
 
-    elif 'XEF1000' in each_cmd['commands']:
+    elif event_code == cec.XEF1000:
         XEF1000_date = each_cmd['date']
         xef1000_acq = True
 
     # If the event is EPERIGEE, determine if the HETG is in - it better be.
-    elif 'EPERIGEE' in each_cmd['commands']:
+    elif event_code == cec.EPERIGEE:
         eqf013m_acq = False
         eef1000_acq = False
         # Perigee Check - if the HETG is not in by now that is an error
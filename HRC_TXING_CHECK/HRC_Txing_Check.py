@@ -17,9 +17,8 @@
 #
 ################################################################################
 import argparse
-import math
 import numpy as np
-import shutil
+import os
 import sys
 
 # Import the BackstopHistory class
@@ -29,11 +28,21 @@ from backstop_history import BackstopHistory
 import apt_date_secs as apt
 import Backstop_File_Processing as bfp
 import Calc_Delta as cd
+import Command_Event_Codes as cec
 
-import Insert_Comment_In_ALR as icia
+import ALR_Document_Class
 
 import ORP_File_Class as ofc
 
+import SI_Mode_Sequence_Class
+
+# Keep astropy from going to the network for IERS or leap second data.
+# apt_date_secs configures astropy itself, but only when it first needs it.
+# backstop_history converts times with astropy directly, so astropy has to
+# be configured here, before backstop_history is used.
+import Time_Configuration
+Time_Configuration.Configure_Astropy()
+
 """
 The basic structure of a with-bias SI mode command sequence is:
 
@@ -91,8 +100,9 @@ These are the checks, errors and warnings performed by this program:
                       - Allows a 1 second differential IF Stop Science occurs first.
 
 4) WARINING - The sequence of the commands to load the NIL SI mode is missing a command
+                      or has an extra command inserted
 
-5) WARNING - The timing of the commands to load the NIL SI mode has an extra command inserted
+5) WARNING - The timing of the commands to load the NIL SI mode does not match the SI mode
 
 6) WARNING - Informs the user that there were no  NIL SI mode/SCS-134 activation/215PCAOF groups
                       in the load.
@@ -107,226 +117,94 @@ Version 2.0:
 
     The NIL SI modes are no longer limited to Event Histogram type SI modes. 
     The code comments and informational statements were changed to reflect this.
-    New SI modes can be added by creating a .dat  file with the commands and delays.
-    and editing the PB_to_Mode_Map.dat file.  The program no longer needs to be modified
-    when a new NIL SI mode is created. Since we usually use the same SI mode
+    New SI modes could be added by creating a .dat file with the commands and delays
+    and adding the mode to PB_to_Mode_Map.dat (no longer needed - see Version 2.1).
+    The program no longer needs to be modified when a new NIL SI mode is created. Since we usually use the same SI mode
     for HRC observations in a load, the code will check to see if the command sequence
     for that load was already loaded and if so, will not repeat the loading.
 
     Function Check_Command_Sequence was added to detect if the SI mode command
     sequence was tampered with inadvertantly. The sequence of commands and times 
     between the commands are checked.
+
+Version 2.1:
+
+    The NIL SI mode load sequences are found by SI_Mode_Sequence_Class, which
+    compiles all of the H*C_*.dat files into a state machine and finds every
+    full or partial sequence in one forward pass over the extracted commands.
+    The start of the SI mode load is the first command of the sequence found,
+    rather than the command 6 before the parameter block. In every SI mode
+    defined so far the parameter block is the 7th command (H2C_0002B's window
+    command comes after it), but a load sequence with missing or extra
+    commands ahead of the parameter block is now also timed correctly.
+    Every missing or extra command and timing error in the sequence is
+    reported.
+
+    PB_to_Mode_Map.dat is no longer needed: the parameter block command of
+    each SI mode is the one in its .dat file with a bias time. A new NIL SI
+    mode is added by adding its H*C_*.dat file.
     
 """
 
 #-------------------------------------------------------------------------------
 #
-# Read_PB_to_Mode_Map
+# Report_Sequence_Deviations
 #
 #-------------------------------------------------------------------------------
-def PB_to_Mode_Map(data_files_dir):
+def Report_Sequence_Deviations(extracted_cmds, extracted_packets, si_mode_sequence, comment_list):
     """
-    Read in the PB_to_Mode_Map.dat file and create a dictionary of
-    the two entries on each line of the file. The first entry is the
-    parameter block command for that NIL SI mode 
-    (e.g.WT00DAA014) and the second entry is the name of the file
-    (no extension) that can be read to obtain the sequence of commands
-    for that SI mode.
-
-    This mapping is done because it's easier to recognize the SI mode
-    represented by a file if we use the SI mode name (e.g. H2C_0002B)
-    and not the parameter block command.
-    """
-    # Initialize an empty dictionary
-    pb_to_mode_map = {}
-
-    # Open the mapping file
-    mapfile = open(data_files_dir+"PB_to_Mode_Map.dat", "r")
+    Given the extracted commands and one NIL SI mode load sequence found by
+    SI_Mode_Sequence_Recognizer.Find_Sequences, add a warning to the comment
+    list for:
+         - Each command missing from the SI mode load sequence
+         - Each extra command inside the SI mode load sequence
+         - Each timing error between successive commands
 
-    # Read each line in the map file and process the two entries turning the
-    # entries into a dictionary which maps the parameter block command
-    # (WT.......) with the file that contains the information about that  sequence.
-    for eachline in mapfile:
-        # Update the dictionary with the new entry
-        pb_to_mode_map.update({eachline.split()[0]: eachline.split()[1]+".dat"})
-
-    # Done with the file: close it.
-    mapfile.close()
-
-    # Return the mapping dictionary which maps the  parameter block to SI mode
-    # the SI mode defintion file
-    return pb_to_mode_map
-
-#-------------------------------------------------------------------------------
-#
-# extract_command_packet
-#
-#-------------------------------------------------------------------------------
-def extract_command_packet(cmd_string):
-    """
-    Given any CR*.backstop file ACISPKT line, strip out the ACIS command that is
-    contained within that line. This function assumes that only ACISPKT lines
-    will be input.
-    """
-    # Extract the value after "TLMSID=" by successive splits and strip
-    # out any leading or trailing blanks
-    packet = cmd_string["commands"].split("TLMSID=")[1].split(",")[0].strip()
-    
-    # Return the extracted ACIS packet command
-    return packet
+    Any generated warnings will appear in the ACIS-LoadReview.txt file.
 
+    inputs:
 
-#-------------------------------------------------------------------------------
-#
-# Read SI Mode
-#
-#-------------------------------------------------------------------------------
-def Read_SI_Mode_File(filespec):
+        extracted_cmds -   All the extracted commands: extracted_cmds
+        extracted_packets - The ACIS packet of each extracted command, or ""
+                            for commands which are not ACISPKT commands
+        si_mode_sequence - The sequence found
+        comment_list - The list of comments to append the warnings to
     """
-    Given the path to a NIL SI mode definition file, this function will
-    read the specified SI mode command file and store the data in a list
-    of lists. Each sublist consists of:
+    # Missing commands
+    for load_index, missing_cmd in si_mode_sequence["missing"]:
+        full_comment = " ".join(( ">>> WARNING - ", extracted_cmds[load_index]["date"], "The", si_mode_sequence["mode"], "SI mode load is missing the command: ", missing_cmd ))
 
-        [ "command", delay]
+        # Inform the Load Reviewer in real time that a problem was found.
+        print("\n", extracted_cmds[load_index]["date"], full_comment)
 
-        or, in the case of the parameter block command:
+        # Append the comment to the comment list
+        comment_list.append([extracted_cmds[load_index]["date"], extracted_cmds[load_index]["time"], full_comment])
 
-         [ "command", delay, bias_secs]
+    # Extra commands. Those which are not ACISPKT commands have no packet,
+    # so report the whole command.
+    for load_index in si_mode_sequence["extra"]:
+        extra_cmd = extracted_packets[load_index] or extracted_cmds[load_index]["commands"].strip()
 
-    Command is a string and the delays and bias_secs are integers.
+        full_comment = " ".join(( ">>> WARNING - ", extracted_cmds[load_index]["date"], "The actual command in the load: ", extra_cmd, "is not part of the", si_mode_sequence["mode"], "SI mode load" ))
 
-    The order of the commands in the list is the same as what appears in the ACIS tables.
+        # Inform the Load Reviewer in real time that a problem was found.
+        print("\n", extracted_cmds[load_index]["date"], full_comment)
 
-    """
-    # Open the required file for reading
-    mode_file = open(filespec, "r")
-    
-    # Read each line, split on spaces and add the command delay values
-    # as a list to the command list.
-    file_list = [data_line.split() for data_line in mode_file]
-
-    # Initialize the output command list
-    command_list = []
-    
-    # Convert all the delays and bias times into integers
-    for each_cmd in file_list:
-        command_list.append([each_cmd[0]] + [int(each_num) for each_num in each_cmd[1:]])
-    
-    # Return the command list
-    return command_list
-                
+        # Append the comment to the comment list
+        comment_list.append([extracted_cmds[load_index]["date"], extracted_cmds[load_index]["time"], full_comment])
 
-#-------------------------------------------------------------------------------
-#
-# Check_Command_Sequence
-#
-#-------------------------------------------------------------------------------
-def Check_Command_Sequence(extracted_cmds, wt_index, pb_command, si_mode_command_list, comment_list  ):
-    
-    """
-    This function works through the array of commands which consist of the
-    ACISPKT, COACTS1=134 and 215PCAOF commands, extracted from the load,
-    and starting from the WT parameter block commands and working backwards,
-    looks for:
-         - Any commands missing from the SI mode load sequence
-         - Any extra commands inside the SI mode load sequence
-         - Any timing errors between successive commands 
-
-    The function only produces warnings. Any generated warnings will appear in
-    the ACIS-LoadReview.txt file.   Also, since a missing command will throw the
-    entire command sequence off, the function will throw only one command
-    warning and only one timing warning.
+    # Timing errors
+    for load_index, expected_dt, actual_dt in si_mode_sequence["timing"]:
+        full_comment = " ".join(( ">>> WARNING - ", extracted_cmds[load_index]["date"], " The Time delta between the present command and the previous one does not match the si mode definition.\n", "Expected: ", str(expected_dt), "Actual: ", str(actual_dt)))
 
-    inputs:
+        # Inform the Load Reviewer in real time that a problem was found.
+        print("\n", extracted_cmds[load_index]["date"], full_comment)
 
-        extracted_cmds -   All the extracted commands: extracted_cmds
-        wt_index -  The index of the WT command in the extracted commands
-        pb_command -  The WT Command itself
-        si_mode_command_list -  The <SI Mode>.dat file information contents
-                                                 which is the command sequence for this SI mode.
-    """
-    #
-    # Inits
-    #
-    
-    # Epsilon allowed for calculation of the delta between execution times
-    epsilon = 0.1
-    
-    # Using the data for  the required SI mode, work through the commands in
-    # the command list for that  si mode and make sure they exist in the load at the
-    # proper intervals. You are starting with the WT parameter block command
-    # and moving BACKWARD.
+        # Append the comment to the comment list
+        comment_list.append([extracted_cmds[load_index]["date"], extracted_cmds[load_index]["time"], full_comment])
 
-    # Get the index of the WT command within the si_mode_command_list
-    present_cmd_index_simode =  [each_index for each_index, WTcmd in enumerate(si_mode_command_list) if WTcmd[0] == pb_command][0]
-    
-    #wt_index points to the WT parameter block command in the load.
-    present_cmd_index_load = wt_index
-    
-    # Set the warning flags to False as we want to report only the first
-    # sequence and/or timing warning
-    warning_sequence_flag = False
-    warning_timing_flag = False
-    
-    # Loop through the comands for this SI mode (skipping the parameter
-    # block/bias value line) and,
-    # 1) Check that the previous command matches the expected si
-    #     mode command and
-    # 2) compare the delta t between the present command and the one before it
-
-    # For every command that comes before the WT command.....
-    while present_cmd_index_simode != 0:
-        # Extract the expected command from the si_mode_command_list
-        each_expected_cmd = si_mode_command_list[present_cmd_index_simode-1]
-        
-        # Extract the actual ACIS command from the load line
-        actual_cmd = extract_command_packet(extracted_cmds[present_cmd_index_load - 1])
-    
-        # COMMAND MNEMONIC CHECK - Check to see if the command matches the expected command
-        if (warning_sequence_flag == False) and (each_expected_cmd[0] != actual_cmd):
-                    
-            # WARNING -  Place a warning statement in the comments list, and print it out for the log file.
-            full_comment = " ".join(( ">>> WARNING - ", extracted_cmds[present_cmd_index_load - 1]["date"], "The actual command in the load: ", actual_cmd, "does not match the expected command: ", each_expected_cmd[0] ))
-            
-            # Inform the Load Reviewer in real time that a problem was found.
-            print("\n",extracted_cmds[present_cmd_index_load - 1]["date"], full_comment)
-            
-            # Append the comment to the comment list
-            comment_list.append([extracted_cmds[present_cmd_index_load - 1]["date"], extracted_cmds[present_cmd_index_load - 1]["time"], full_comment])
-            # Set the warning flag to True so that only one warning of this type is given
-            warning_sequence_flag = True
-
-        # TIMING CHECK  - Correct command; now check the time delta between this
-        # command and the one before it in the load
-        else: 
-                # delta between this command and the one before it in the load
-            dt_load = extracted_cmds[present_cmd_index_load]["time"] - extracted_cmds[present_cmd_index_load - 1]["time"]
-
-            # Extract the expected dt between this command and the one before
-            # it in the SI mode command list
-            dt_smcl = each_expected_cmd[1]           
-            
-            # If the time pointed to by present_cmd_index minus dt is equal
-            # to the time of the previous command, all is well.
-            if (warning_timing_flag == False) and (not math.isclose( dt_load, dt_smcl, rel_tol = epsilon)):
-                full_comment = " ".join(( ">>> WARNING - ", extracted_cmds[present_cmd_index_load - 1]["date"], " The Time delta between the present command and the previous one does not match the si mode definition.\n", "Expected: ", str(each_expected_cmd[1]), "Actual: ", str(dt_load)))
-                
-                # Inform the Load Reviewer in real time that a problem was found.
-                print("\n", extracted_cmds[present_cmd_index_load - 1]["date"], full_comment)
-
-                # Append the comment to the comment list
-                comment_list.append([extracted_cmds[present_cmd_index_load - 1]["date"], extracted_cmds[present_cmd_index_load - 1]["time"], full_comment])
-                # Set the warning flag to True so that only one warning of this type is given
-                warning_timing_flag = True
-    
-            # Move up one command in the load extracted command array
-            present_cmd_index_load -= 1
-            present_cmd_index_simode -=1
-            
     # Return the comment list
     return comment_list
-    
-
 
 
 #===============================================================================
@@ -352,28 +230,19 @@ load_week_path = args.review_load_path
 # Inits
 #
 
-# Set the variable specifying which was the last SI mode file read to None
-last_si_mode_file_read = None
-
 # Initialize the NIL SI mode loaded flag to False
 si_mode_loaded_flag = False
 
-# Initialize the container for NIL SI mode commands to None
-si_mode_command_list = None
-
 # Create the list which will contain all the HRC/Txing time delta comments
 # which will appear in the ACIS-LoadReview.txt file.
 comment_list = []
 
-# Specify the base directory with the data files reside
-data_files_dir = "/data/acis/LoadReviews/script/HRC_TXING_CHECK/"
+# The SI mode .dat files reside in the directory holding this program
+data_files_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Read the Parameter Block to SI mode definition file map
-pb_to_mode_map = PB_to_Mode_Map(data_files_dir)
-
-# Make a list, using the pb_to_mode_map dict keys, of all the parameter blocks in
-# the SI modes that could be used when HRC is observing
-NIL_SI_parameter_block_list = list(pb_to_mode_map.keys())
+# Compile the recognizer of the load sequences of the SI modes that could be
+# used when HRC is observing, from their .dat files
+si_mode_recognizer = SI_Mode_Sequence_Class.SI_Mode_Sequence_Recognizer(data_files_dir)
 
 #
 # Assemble the Load History
@@ -421,32 +290,41 @@ assembled_commands = BSC.Assemble_History(BSC.outdir, tbegin, False)
 # Tell the user what we are checking
 print('\n    HRC Txing  Check for load week: ', load_week)
 
-# Make a new, empty, numpy array which will contain any command that is either
-# an ACISPKT command or has COACTS1=134 in the command string
-extracted_cmds = np.array([], dtype = assembled_commands.dtype)
-
-# Run through the commands and create the array: extracted_cmds
+# Select, from the assembled commands, the array: extracted_cmds
 # extracted_cmds will contain any command that:
 #    1) is an ACISPKT command,
 #    2) contains COACTS1=134
 #    3) contains 215PCAOF
 # These are the commands we need in order to check the TXING timing.
-for eachcmd in assembled_commands:
-    # Test to see if this is one of the commands we want to keep
-    if ("ACISPKT" in eachcmd["commands"]) or \
-       ("COACTS1=134" in eachcmd["commands"]) or \
-       ("215PCAOF" in eachcmd["commands"]):
-        new_row = np.array( [ (eachcmd["commands"],
-                                             eachcmd["time"],
-                                             eachcmd["date"]) ], dtype = BSC.CR_DTYPE)
-        
-        extracted_cmds =  np.append(extracted_cmds, new_row, axis=0)
+#
+# Every command is classified once into the event it represents, and the
+# wanted rows are pulled out, in order, with one fancy index. The event code
+# of each extracted command is kept in extracted_codes.
+event_codes = cec.Classify_Commands(assembled_commands["commands"])
+
+keep_mask = np.isin(event_codes, cec.ACISPKT_CODES + (cec.SCS134_ACTIVATE, cec.HRC_15V_OFF))
+
+extracted_cmds = assembled_commands[np.nonzero(keep_mask)[0]]
+extracted_codes = event_codes[keep_mask]
+
+# Find every NIL SI mode load sequence, full or partial, in the extracted
+# commands. si_mode_sequences maps the index of each NIL SI mode parameter
+# block command to the sequence found around it.
+#
+# The extracted commands are parsed once, by Backstop_File_Processing, and the
+# packet of each is read from the tlmsid column. Only ACISPKT commands have a
+# packet; the others (COACTS1=134, 215PCAOF) are given an empty mnemonic,
+# which is in no SI mode.
+extracted_tlmsids = bfp.Backstop_File_Class().Process_BSH_Array(extracted_cmds)["tlmsid"]
+extracted_packets = np.where(np.isin(extracted_codes, cec.ACISPKT_CODES), extracted_tlmsids, "")
+
+si_mode_sequences = si_mode_recognizer.Find_Sequences(extracted_packets, extracted_cmds["time"])
 
 #
 # Process the extracted commands checking any NIL SI modes that appear.
 #
 
-# Now step through the array and look for any command which contains one of  the
+# Now step through the array and look for any command which is one of  the
 # parameter block WT commands that are presently used for HRC observation
 # si modes. If you find one process that command sequence checking for errors.
 #
@@ -454,14 +332,17 @@ for eachcmd in assembled_commands:
 for index, each_cmd in enumerate(extracted_cmds):
     # HRC OBSERVING?
     # Detect if we are loading one of the  ACIS NIL SI modes used when HRC is observing.
-    # Any time one of the HRC Observation SI modes exists in extracted_cmds,
-    # save it.  If there are no HRC Observations in the load,  the list will be empty
-    key_list = [eachkey  for eachkey in NIL_SI_parameter_block_list if eachkey in each_cmd["commands"]  ]
+    # If this is the parameter block command of one, this is the load sequence
+    # found for it. Otherwise it's None.
+    si_mode_sequence = si_mode_sequences.get(index)
+
+    # The event this command represents
+    event_code = extracted_codes[index]
 
     # If  one of the HRC-Observing SI modes parameter blocks appears in this
     # command line but we already found an HRC observing si mode but have not yet seen
     # its corresponding SCS-134 activation command, we found an error
-    if key_list and (si_mode_loaded_flag == True):
+    if si_mode_sequence and (si_mode_loaded_flag == True):
         
         # ERROR -  Place an error statement in the comments list, and print it out for the log file.
         full_comment = " ".join((each_cmd["date"], "\n>>> ERROR - ", each_cmd["date"], "Multiple NIL SI Mode loads without an intervening SCS-134 activation"))
@@ -471,91 +352,55 @@ for index, each_cmd in enumerate(extracted_cmds):
         # Set the bias start date and time to this latest NIL  SI Mode load
         # That way when the next COACT1=134 is observed, the correct actual delta T
         # will be calculated from this SI mode load.
-        bias_start_date = extracted_cmds[index - 6]["date"]
-        bias_start_time = extracted_cmds[index - 6]["time"]
+        bias_start_date = extracted_cmds[si_mode_sequence["first_index"]]["date"]
+        bias_start_time = extracted_cmds[si_mode_sequence["first_index"]]["time"]
 
     # Else if this is the first HRC Observing SI Mode load since the start of
     # the load or the first since the last EV Load/SCS-134 activation pair.
-    elif key_list and (si_mode_loaded_flag == False):
+    elif si_mode_sequence and (si_mode_loaded_flag == False):
         
         # You have found one of the SI modes used during an HRC science observation
         # Set the Event History SI mode found flag to True
         si_mode_loaded_flag = True
 
-        # Capture the name of the WT packet id
-        pb_command = key_list[0]
-        
-        # Determine the name of the file required to read in the commands for this SI mode
-        
-        # Next load in the appropriate NIL SI mode file unless it was the last file
-        # to have been loaded.
-        required_file = pb_to_mode_map[pb_command]
-
-        # Ordinarily the same SI mode is used every time an HRC observation is
-        # executed. So if we have already processed an HRC observation and loaded
-        # in an SI mode we can save some time by not re-loading it.
-        # But it's not an ironclad rule. So in case there's a mix of NIL SI
-        # modes used in the load, we will check to see if the presently required
-        # SI mode file has  already been read in. 
-        if (not si_mode_command_list) or  last_si_mode_file_read != required_file:
-        
-            # This SI mode is not loaded. Either because it's the first time
-            # it's been seen in the load or because some other HRC-observing
-            # si mode was seen before this one.
-               
-            # Load the commands for this SI mode
-            si_mode_command_list = Read_SI_Mode_File(data_files_dir+required_file)
-            
-            # Set the last file read variable
-            last_si_mode_file_read = required_file
-        
-        # Call the Check_Command_Sequence function to look for any commands within the
-        # SI mode loading sequence that were inserted, or missing or have unexpected timing.
-        comment_list = Check_Command_Sequence(extracted_cmds, index,  pb_command, si_mode_command_list, comment_list)
-
-        # Calculate the index of the first start science command in the SI mode load
-        # This assumes the SI mode is with bias and there are no intervening or missing
-        # ACIS commands in the SI mode load sequence.
-        first_start_science_index = index - 6
+        # Report any commands within the SI mode loading sequence that were
+        # inserted, or missing or have unexpected timing.
+        comment_list = Report_Sequence_Deviations(extracted_cmds, extracted_packets, si_mode_sequence, comment_list)
 
         # Calculate the required delta t given the SI mode bias time
-        # Extract the bias time from the si_mode_command_list
-        bias_secs = si_mode_command_list[[index for index, each_cmd in enumerate(si_mode_command_list) if each_cmd[0] == pb_command][0]][2]
-        required_dt = bias_secs + 1152.0
+        required_dt = si_mode_sequence["bias_secs"] + 1152.0
          
         # The next step is to find the corresponding COACTS1=134 command that subsequently
         # appears in the load.  This will allow you to calculate the time delta between the start
         # of loading that SI mode and the activation of SCS-134
 
         # Record the start date and time of the first command in the SI mode load
-        bias_start_date = extracted_cmds[index - 6]["date"]
-        bias_start_time = extracted_cmds[index - 6]["time"]
+        bias_start_date = extracted_cmds[si_mode_sequence["first_index"]]["date"]
+        bias_start_time = extracted_cmds[si_mode_sequence["first_index"]]["time"]
         
     # If this is an ACISPKT command and a  parameter block load command
     # (starts with WT) but not one of the NIL SI  modes used when
     # HRC is observing, then you are loading some other SI mode which
     # "overwrites" whatever the active SI mode is. So set the loaded flag to False.
-    if (not key_list) and \
-       ("ACISPKT" in each_cmd["commands"]) and \
-       (("TLMSID= WT" in each_cmd["commands"]) or \
-        ("TLMSID= WC" in each_cmd["commands"])):
+    if (not si_mode_sequence) and \
+       (event_code == cec.PARAMETER_BLOCK):
         si_mode_loaded_flag = False
 
     # XTZ0000005 - and a NIL SI mode was loaded . Signal the
     # NIL Start Science.
-    if ("XTZ0000005" in  each_cmd["commands"]) and \
+    if (event_code == cec.START_SCIENCE_TE) and \
        (si_mode_loaded_flag == True):
         nil_si_mode_running = True
 
     # XTZ0000005 - and a NIL SI mode has NOT been loaded.  Signal that
     # a NIL SI mode has not started.
-    elif ("XTZ0000005" in  each_cmd["commands"]) and \
+    elif (event_code == cec.START_SCIENCE_TE) and \
          (si_mode_loaded_flag == False):
         nil_si_mode_running = False
 
     # In this case if a CC mode is started then you know that and a NIL command was not loaded
     # and cannot be running
-    elif "XCZ0000005" in  each_cmd["commands"]:
+    elif event_code == cec.START_SCIENCE_CC:
         si_mode_loaded_flag == False
         nil_si_mode_running = False
         
@@ -565,7 +410,7 @@ for index, each_cmd in enumerate(extracted_cmds):
     # load that should have come prior to this command.  This is an error. Add an error
     # comment, and print it out for the log file. This will catch all errors of this type if there
     # are one or more HRC observations in the load.
-    if ("COACTS1=134" in each_cmd["commands"]) and \
+    if (event_code == cec.SCS134_ACTIVATE) and \
          ( si_mode_loaded_flag == False):
 
         # Set the hrc activated and running flags to True
@@ -586,7 +431,7 @@ for index, each_cmd in enumerate(extracted_cmds):
     # ERROR 
     # HRC START command but no acceptable ACIS SI mode  is  running. Give a grace
     # period of one second to account for time calculation accuracies.It may not happen the same way next time. 
-    elif ("COACTS1=134" in each_cmd["commands"]) and \
+    elif (event_code == cec.SCS134_ACTIVATE) and \
          ( nil_si_mode_running == False):
         
         # Set the hrc activated and running flags to True
@@ -627,7 +472,7 @@ for index, each_cmd in enumerate(extracted_cmds):
     # Else, if you have found a NIL SI mode and this command is the 
     # corresponding SCS-134 activation, you can calculate  the delta time
  
-    elif ("COACTS1=134" in each_cmd["commands"]) and \
+    elif (event_code == cec.SCS134_ACTIVATE) and \
          ( si_mode_loaded_flag == True) and \
          (nil_si_mode_running == True):
         
@@ -658,13 +503,13 @@ for index, each_cmd in enumerate(extracted_cmds):
     #                         clocking. And if a NIL SI mode  is running that gets
     #                         stopped too. So there's no need to differentiate between one of
     #                         the two NIL SI modes or any other.
-    if  ("AA00000000" in  each_cmd["commands"]):
+    if  (event_code == cec.STOP_SCIENCE):
         nil_si_mode_running = False
         stop_science_date = each_cmd["date"]
         stop_science_time = each_cmd["time"]
         
     # 215PCAOF - HRC Observation complete.
-    if ("215PCAOF" in  each_cmd["commands"]):
+    if (event_code == cec.HRC_15V_OFF):
         # Create the string that indicates the HRC obs 15V power down command issued.
         HRC_shutdown_string = each_cmd["date"] + " 215PCAOF command: HRC Observation Ends"
         comment_list.append([each_cmd["date"], each_cmd["time"], HRC_shutdown_string])
@@ -711,26 +556,28 @@ for index, each_cmd in enumerate(extracted_cmds):
         hrc_activated_flag = False
 
 # Done finding all HRC Txing delta t's. If there are lines in the comment_list, insert
-# them in a copy of ACIS_LoadReview.txt called ACIS_LoadReview.txt.TXING_COMMENT
+# them in ACIS_LoadReview.txt
 if len(comment_list)> 0:
     # There are comments - insert them
-    icia.Insert_Comment_In_ALR(comment_list, load_week_path, "HRC_TXING")
-
-    # Copy the updated ACIS-LoadReview.txt file
-    # If the test flag was False, and there were comments, then copy the .HRC_TXING
-    # file to ACIS-LoadReview.txt.
-    # If the test flag was True then we leave the original ACIS-LoadReview.txt and the
-    # ACIS-LoadReview.txt.HRC_TXING (if there is one)  files intact for comparison.
+    alr_doc = ALR_Document_Class.ALR_Document_Object(load_week_path+'/ACIS-LoadReview.txt')
+    alr_doc.Add_Comments(comment_list)
+
+    # Write the updated ACIS-LoadReview.txt file
+    # If the test flag was False, and there were comments, then replace
+    # ACIS-LoadReview.txt with it.
+    # If the test flag was True then we leave the original ACIS-LoadReview.txt intact
+    # and write ACIS-LoadReview.txt.HRC_TXING for comparison.
     if (args.test == False):
         try:
-            print('\n    Copying ACIS-LoadReview.txt.HRC_TXING to ACIS-LoadReview.txt')
-            shutil.copy(load_week_path+'/ACIS-LoadReview.txt.HRC_TXING', load_week_path+'/ACIS-LoadReview.txt')
+            print('\n    Writing the HRC Txing comments into ACIS-LoadReview.txt')
+            alr_doc.Write()
         except OSError as err:
             print(err)
-            print('Examine the ofls directory and look for the HRC_TXING file.')
+            print('ACIS-LoadReview.txt was left unchanged.')
         else:
             print('    Copy was successful')
     else:
+        alr_doc.Write('HRC_TXING')
         print('\n    Leaving the ACIS-LoadReview.txt  unchanged')
 
 else:
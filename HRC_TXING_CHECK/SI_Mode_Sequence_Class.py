@@ -0,0 +1,337 @@
+################################################################################
+#
+# SI_Mode_Sequence_Class - Recognize the command sequences which load the
+#                          NIL SI modes used when HRC is observing.
+#
+################################################################################
+import glob
+import math
+import os
+
+"""
+Each NIL SI mode is defined by a <SI mode>.dat file (e.g. H2C_0002B.dat) which
+lists the commands that load the SI mode, in order, with the delay, in
+seconds, from each command to the next. The parameter block (WT) command
+also gives the bias time of the SI mode:
+
+    AA00000000      4
+    ...
+    WT00DAA014    4 919
+    W200138014     4
+    XTZ0000005      4
+
+SI_Mode_Sequence_Recognizer reads all of the H*C_*.dat files in a directory
+once, and compiles them into a state machine. A state is an SI mode and the
+number of its commands seen so far. The transition table maps a command
+mnemonic to every (SI mode, position) that the command can fill.
+
+Find_Sequences then takes the mnemonics and times of the commands in a
+load and, in one forward pass, follows every possible partial match of
+every SI mode. A match is allowed to:
+
+    - skip up to max_skip expected commands at a time (missing commands)
+    - pass over up to max_skip load commands in a row which are not part of
+      the sequence (extra commands)
+
+The time between each command matched and the previous one matched is
+compared with the time the definition gives.
+
+Only matches which contain the parameter block command are reported, since
+that is what identifies the SI mode. If more than one match contains the
+same parameter block command, the one with the fewest missing and extra
+commands is kept.
+
+New NIL SI modes are added by adding their H*C_*.dat file. No code
+changes are needed.
+"""
+
+#-------------------------------------------------------------------------------
+#
+# Read SI Mode
+#
+#-------------------------------------------------------------------------------
+def Read_SI_Mode_File(filespec):
+    """
+    Given the path to a NIL SI mode definition file, this function will
+    read the specified SI mode command file and store the data in a list
+    of lists. Each sublist consists of:
+
+        [ "command", delay]
+
+        or, in the case of the parameter block command:
+
+         [ "command", delay, bias_secs]
+
+    Command is a string and the delays and bias_secs are integers.
+
+    The order of the commands in the list is the same as what appears in the ACIS tables.
+
+    """
+    # Open the required file for reading
+    mode_file = open(filespec, "r")
+
+    # Read each line, split on spaces and add the command delay values
+    # as a list to the command list. Skip any blank lines.
+    file_list = [data_line.split() for data_line in mode_file if data_line.strip()]
+
+    # Done with the file: close it.
+    mode_file.close()
+
+    # Initialize the output command list
+    command_list = []
+
+    # Convert all the delays and bias times into integers
+    for each_cmd in file_list:
+        command_list.append([each_cmd[0]] + [int(each_num) for each_num in each_cmd[1:]])
+
+    # Return the command list
+    return command_list
+
+
+class SI_Mode_Sequence_Recognizer:
+    """
+    State machine, compiled from the H*C_*.dat files in data_files_dir,
+    which finds the NIL SI mode load sequences in a list of commands.
+
+    max_skip - The most expected commands which may be missing, or load
+               commands which may be extra, in a row.
+    epsilon - Relative tolerance of the timing checks.
+
+    FileNotFoundError is raised if there are no H*C_*.dat files in
+    data_files_dir.
+    """
+    def __init__(self, data_files_dir, max_skip = 2, epsilon = 0.1):
+        self.max_skip = max_skip
+        self.epsilon = epsilon
+
+        # One entry per SI mode
+        self.modes = []
+
+        mode_files = sorted(glob.glob(os.path.join(data_files_dir, "H*C_*.dat")))
+
+        # Without any SI mode definitions no sequence could ever be found
+        if len(mode_files) == 0:
+            raise FileNotFoundError("No NIL SI mode definition files (H*C_*.dat) in " + data_files_dir)
+
+        for filespec in mode_files:
+            command_list = Read_SI_Mode_File(filespec)
+
+            # The parameter block command is the one with a bias time
+            pb_position = [position for position, each_cmd in enumerate(command_list) if len(each_cmd) > 2][0]
+
+            # Time of each command from the start of the sequence
+            offsets = [0]
+            for each_cmd in command_list[:-1]:
+                offsets.append(offsets[-1] + each_cmd[1])
+
+            self.modes.append({"name": os.path.splitext(os.path.basename(filespec))[0],
+                               "commands": [each_cmd[0] for each_cmd in command_list],
+                               "offsets": offsets,
+                               "pb_position": pb_position,
+                               "pb_command": command_list[pb_position][0],
+                               "bias_secs": command_list[pb_position][2]})
+
+        # The transition table: for each command mnemonic, the list of
+        # (mode index, position) which the command fills.
+        self.transitions = {}
+
+        for mode_index, mode in enumerate(self.modes):
+            for position, mnemonic in enumerate(mode["commands"]):
+                self.transitions.setdefault(mnemonic, []).append((mode_index, position))
+
+        # The parameter block commands of all the SI modes
+        self.pb_commands = [mode["pb_command"] for mode in self.modes]
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Find_Sequences - Find every NIL SI mode load sequence, full or
+    #                          partial, in a list of commands
+    #
+    #---------------------------------------------------------------------------
+    def Find_Sequences(self, mnemonics, times):
+        """
+        Given the command mnemonics (e.g. "WT00DAA014") of a time ordered
+        list of commands, and their times in seconds, return a dict which
+        maps the index of each NIL SI mode parameter block command to the
+        sequence found around it:
+
+            mode - Name of the SI mode (e.g. "H2C_0002B")
+            pb_command - The parameter block command
+            bias_secs - Bias time of the SI mode
+            pb_index - Index of the parameter block command
+            first_index - Index of the first command of the sequence found
+            missing - List of (index, mnemonic) of the commands which are
+                      missing. index is that of the command the missing
+                      one should have come before (or the last command
+                      of the sequence if the missing one is at the end).
+            extra - List of the indices of the commands which are inside
+                    the sequence but not part of it
+            timing - List of (index, expected dt, actual dt) of the commands
+                     whose time from the previous command of the sequence
+                     is not what the definition gives
+        """
+        # Partial matches being followed
+        active = []
+
+        # For each parameter block index, the best match which contains it
+        best_matches = {}
+
+        for load_index, mnemonic in enumerate(mnemonics):
+            event_time = times[load_index]
+
+            still_active = []
+
+            # Advance every partial match over this command
+            for match in active:
+                mode = self.modes[match["mode_index"]]
+                position = match["position"]
+
+                # Is this command the next expected one, or one shortly after it?
+                next_positions = [each_position for each_position in range(position, min(position + self.max_skip + 1, len(mode["commands"])))
+                                  if mode["commands"][each_position] == mnemonic]
+
+                if next_positions:
+                    self.Match_Command(match, next_positions[0], load_index, event_time)
+                elif match["extra_in_a_row"] < self.max_skip:
+                    # Not part of the sequence; pass over it
+                    match["extra"].append(load_index)
+                    match["extra_in_a_row"] += 1
+                else:
+                    # Too many commands which don't fit - this match is over
+                    self.End_Match(match, best_matches)
+                    continue
+
+                if match["position"] == len(mode["commands"]):
+                    self.End_Match(match, best_matches)
+                else:
+                    still_active.append(match)
+
+            # Start a new match for each SI mode position this command can
+            # fill near the start of a sequence. A parameter block command
+            # always starts one so that every SI mode load is reported.
+            for mode_index, position in self.transitions.get(mnemonic, []):
+                mode = self.modes[mode_index]
+
+                if (position <= self.max_skip) or (position == mode["pb_position"]):
+                    match = {"mode_index": mode_index,
+                             "position": 0,
+                             "matched": [],
+                             "missing": [],
+                             "extra": [],
+                             "extra_in_a_row": 0,
+                             "timing": []}
+
+                    self.Match_Command(match, position, load_index, event_time)
+
+                    if match["position"] == len(mode["commands"]):
+                        self.End_Match(match, best_matches)
+                    else:
+                        still_active.append(match)
+
+            # Matches of the same SI mode which have reached the same point
+            # will carry on identically - keep the best one.
+            unique_matches = {}
+            for match in still_active:
+                match_key = (match["mode_index"], match["position"], match["matched"][-1][1])
+
+                if (match_key not in unique_matches) or (self.Match_Score(match) < self.Match_Score(unique_matches[match_key])):
+                    unique_matches[match_key] = match
+
+            active = list(unique_matches.values())
+
+        # End any matches still open at the end of the commands
+        for match in active:
+            self.End_Match(match, best_matches)
+
+        # Convert the best matches into the results
+        sequences = {}
+
+        for pb_index, match in best_matches.items():
+            mode = self.modes[match["mode_index"]]
+
+            sequences[pb_index] = {"mode": mode["name"],
+                                   "pb_command": mode["pb_command"],
+                                   "bias_secs": mode["bias_secs"],
+                                   "pb_index": pb_index,
+                                   "first_index": match["matched"][0][1],
+                                   "missing": match["missing"],
+                                   "extra": match["extra"],
+                                   "timing": match["timing"]}
+
+        return sequences
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Match_Command - Advance a match over a command which fills the
+    #                         given position of the SI mode
+    #
+    #---------------------------------------------------------------------------
+    def Match_Command(self, match, position, load_index, event_time):
+        """
+        Record that the command at load_index fills position in the match.
+        Any positions skipped are recorded as missing, and the time from the
+        previous command matched is checked.
+        """
+        mode = self.modes[match["mode_index"]]
+
+        for missing_position in range(match["position"], position):
+            match["missing"].append((load_index, mode["commands"][missing_position]))
+
+        if match["matched"]:
+            previous_position, previous_index, previous_time = match["matched"][-1]
+
+            expected_dt = mode["offsets"][position] - mode["offsets"][previous_position]
+            actual_dt = event_time - previous_time
+
+            if not math.isclose(actual_dt, expected_dt, rel_tol = self.epsilon):
+                match["timing"].append((load_index, expected_dt, actual_dt))
+
+        match["matched"].append((position, load_index, event_time))
+        match["position"] = position + 1
+        match["extra_in_a_row"] = 0
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: End_Match - Finish a match and keep it if it is the best one
+    #                     for its parameter block command
+    #
+    #---------------------------------------------------------------------------
+    def End_Match(self, match, best_matches):
+        """
+        Finish the match: commands passed over after the last one matched
+        are not part of it, and any positions not reached are missing.
+        Matches which do not contain the parameter block command are
+        dropped. Otherwise the match is kept in best_matches if it is the
+        best one so far for its parameter block command.
+        """
+        mode = self.modes[match["mode_index"]]
+
+        pb_indices = [load_index for position, load_index, event_time in match["matched"] if position == mode["pb_position"]]
+
+        if not pb_indices:
+            return
+
+        last_index = match["matched"][-1][1]
+
+        match["extra"] = [load_index for load_index in match["extra"] if load_index < last_index]
+
+        for missing_position in range(match["position"], len(mode["commands"])):
+            match["missing"].append((last_index, mode["commands"][missing_position]))
+
+        match["position"] = len(mode["commands"])
+
+        if (pb_indices[0] not in best_matches) or (self.Match_Score(match) < self.Match_Score(best_matches[pb_indices[0]])):
+            best_matches[pb_indices[0]] = match
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Match_Score - How badly a match fits its SI mode
+    #
+    #---------------------------------------------------------------------------
+    def Match_Score(self, match):
+        """
+        Return a tuple which sorts better (lower) matches first: fewest
+        missing and extra commands, then fewest timing errors, then the
+        latest start.
+        """
+        return (len(match["missing"]) + len(match["extra"]), len(match["timing"]), -match["matched"][0][1])
@@ -0,0 +1,102 @@
+################################################################################
+#
+# test_SI_Mode_Sequence_Class - Check that SI_Mode_Sequence_Recognizer finds
+#                               the NIL SI mode load sequences, and reports
+#                               their deviations, using the H*C_*.dat files
+#                               in this directory.
+#
+#   Usage: python3 test_SI_Mode_Sequence_Class.py
+#          or run under pytest
+#
+################################################################################
+import os
+import tempfile
+
+import SI_Mode_Sequence_Class as smsc
+
+data_files_dir = os.path.dirname(os.path.abspath(__file__))
+
+recognizer = smsc.SI_Mode_Sequence_Recognizer(data_files_dir)
+
+def mode_sequence(mode_name, start_time = 1000.0):
+    """
+    Return the mnemonics and times of a load of the named SI mode,
+    exactly as its .dat file defines it.
+    """
+    mode = [each_mode for each_mode in recognizer.modes if each_mode["name"] == mode_name][0]
+
+    return list(mode["commands"]), [start_time + offset for offset in mode["offsets"]]
+
+def test_exact_match():
+    """
+    A load which matches the definition is found, with no deviations.
+    """
+    mnemonics, times = mode_sequence("H2C_0002B")
+    pb_index = mnemonics.index("WT00DAA014")
+
+    sequences = recognizer.Find_Sequences(mnemonics, times)
+
+    assert list(sequences) == [pb_index]
+    assert sequences[pb_index]["mode"] == "H2C_0002B"
+    assert sequences[pb_index]["bias_secs"] == 919
+    assert sequences[pb_index]["first_index"] == 0
+    assert sequences[pb_index]["missing"] == []
+    assert sequences[pb_index]["extra"] == []
+    assert sequences[pb_index]["timing"] == []
+
+def test_skipped_commands():
+    """
+    A missing command, and an extra command, within max_skip are
+    reported and the rest of the sequence is still matched.
+    """
+    mnemonics, times = mode_sequence("H2C_0001B")
+
+    # Drop the second WSPOW and put an unrelated command after RS_0000001
+    del mnemonics[3], times[3]
+    mnemonics.insert(4, "WSVIDALLDN")
+    times.insert(4, times[3] + 1.0)
+
+    pb_index = mnemonics.index("WT00D96014")
+
+    sequences = recognizer.Find_Sequences(mnemonics, times)
+
+    assert list(sequences) == [pb_index]
+    assert sequences[pb_index]["mode"] == "H2C_0001B"
+    assert sequences[pb_index]["first_index"] == 0
+    assert sequences[pb_index]["missing"] == [(3, "WSPOW08812")]
+    assert sequences[pb_index]["extra"] == [4]
+
+def test_timing_deviation():
+    """
+    A delay which is off by more than epsilon is reported; one which is
+    off by less is not.
+    """
+    mnemonics, times = mode_sequence("H1C_0001B")
+    pb_index = mnemonics.index("WT00D98014")
+
+    # RH_0000001 to the WT command should be 23 seconds
+    within_epsilon = times[:pb_index] + [each_time + 1.0 for each_time in times[pb_index:]]
+    beyond_epsilon = times[:pb_index] + [each_time + 10.0 for each_time in times[pb_index:]]
+
+    assert recognizer.Find_Sequences(mnemonics, within_epsilon)[pb_index]["timing"] == []
+    assert recognizer.Find_Sequences(mnemonics, beyond_epsilon)[pb_index]["timing"] == [(pb_index, 23, 33.0)]
+
+def test_no_mode_files():
+    """
+    A directory with no H*C_*.dat files is an error.
+    """
+    empty_dir = tempfile.mkdtemp()
+
+    try:
+        smsc.SI_Mode_Sequence_Recognizer(empty_dir)
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "No error for a directory with no SI mode files"
+    finally:
+        os.rmdir(empty_dir)
+
+if __name__ == '__main__':
+    for each_test in (test_exact_match, test_skipped_commands, test_timing_deviation, test_no_mode_files):
+        each_test()
+        print('PASSED: ', each_test.__name__)
@@ -1,20 +1,27 @@
 import argparse
 import glob
 import numpy as np
-import shutil
 
 import apt_date_secs as apt
 import Calc_Delta as cd
+import Command_Event_Codes as cec
 import SIM_Class as sim_class
 
 from backstop_history import BackstopHistory
 
 import Backstop_File_Processing as bfp
 
-import Insert_Comment_In_ALR as icia
+import ALR_Document_Class
 
 import OFLS_File_Utilities as oflsfu
 
+# Keep astropy from going to the network for IERS or leap second data.
+# apt_date_secs configures astropy itself, but only when it first needs it.
+# backstop_history converts times with astropy directly, so astropy has to
+# be configured here, before backstop_history is used.
+import Time_Configuration
+Time_Configuration.Configure_Astropy()
+
 """
 Idle Dwell time is defined as that time between the first stop science of an ACIS
 science run and the Start Science (XTZ or XCZ) of the next ACIS science run.
@@ -99,9 +106,9 @@ long_dwell_cutoff = 1.5 * 3600.0
 # Create an instance of Backstop_History
 BSHI = BackstopHistory.Backstop_History_Class(outdir = "./", verbose = 0)
 
-# Variable for the stop science command string.
-stop_science_command = "AA00000000"
-start_science_command_list = [ "XCZ0000005", "XTZ0000005"]
+# Event codes of the stop science and start science commands.
+stop_science_code = cec.STOP_SCIENCE
+start_science_codes = [cec.START_SCIENCE_CC, cec.START_SCIENCE_TE]
 
 # Create an instance of Backstop_History
 BSHI = BackstopHistory.Backstop_History_Class(outdir = "./", verbose = 0)
@@ -124,22 +131,19 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
     # Now read the CR*.backstop.hist file
     hist_file = glob.glob(load_week_path+"/CR*.backstop.hist")
 
-    assembled_cmds = BSHI.read_CR_backstop_file(hist_file[0])
-
     # Create an instance of the Backstop File Processing Class
     BFCI = bfp.Backstop_File_Class()
 
-    # Process the assembled commands through the method which converts the commands
-    # into a numpy array with individual columns such as date, time,  command_type,
-    # TLMSID string etc. This prepares it for the extraction of specific commands
-    processed_history = BFCI.Process_BSH_Array(assembled_cmds) 
-
     # Create a list of tokens which tells the program which commands to extract
     token_list = ["SIMTRANS", "XCZ0000005", "XTZ0000005", "AA00000000", "OORMPDS", "EPERIGEE", "OORMPEN"]
 
     # Extract the SIMTRANS, Start and Stop Science, and RADMON commands
-    # out of the assembled and processed commands
-    sim_acis_cmds = BFCI.Extract_Type_and_TLMSID(token_list, processed_history)
+    # while reading the assembled commands. Only the commands which match
+    # a token are parsed and stored, rather than the whole history.
+    sim_acis_cmds = BFCI.Collect_Commands(bfp.iter_commands(hist_file[0], tokens = token_list))
+
+    # Classify each of those commands, once, into the event it represents
+    sim_acis_codes = cec.Classify_Commands(sim_acis_cmds["tlmsid_string"])
     
     # Now remove all the extra AA00000000's except the one immediately after
     # any  Start Science as we don't need them. Also, the very first command in this
@@ -157,18 +161,18 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
     while index < len(sim_acis_cmds):
         # If this is a stop science command and we haven't seen a start science
         # we want to eliminate this line. Append it to AA_mask_list
-        if (stop_science_command in sim_acis_cmds[index]["tlmsid_string"]) and \
+        if (sim_acis_codes[index] == stop_science_code) and \
            (start_sci_flag == False):
             AA_mask_list.append(index)
 
         # If this is a start science command, set the start_sci_flag to True
-        if any( cmd in sim_acis_cmds[index]["tlmsid_string"] for cmd in start_science_command_list):
+        if sim_acis_codes[index] in start_science_codes:
             start_sci_flag = True
 
         # If this is a stop science command and it's the first one after a
         # start science, set the start_sci_flag to False but don't add
         # this line to the masking list
-        if  (stop_science_command in sim_acis_cmds[index]["tlmsid_string"]) and \
+        if  (sim_acis_codes[index] == stop_science_code) and \
             (start_sci_flag == True):
             start_sci_flag = False
             
@@ -176,6 +180,7 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
 
     # Delete all those rows in the mask
     working_array = np.delete(sim_acis_cmds, AA_mask_list, 0)
+    working_codes = np.delete(sim_acis_codes, AA_mask_list, 0)
 
     # working_array is the array of events we will scan and analyze for long
     # idle dwells
@@ -200,7 +205,7 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
     while index < len(working_array):
         
         # OORMPDS - Is this line a RADMON DISABLE entry
-        if "OORMPDS" in working_array[index]["tlmsid_string"]:
+        if working_codes[index] == cec.OORMPDS:
             # Initialize the perigee_passage_dict
             perigee_passage_dict = {"radmon_dis_date": working_array[index]["date"],
                                                      "radmon_dis_time": working_array[index]["time"],
@@ -211,13 +216,13 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
 
         # EPERIGEE - If this is this line an EPERIGEE line, set the perigee passage
         #                    eperigee state to True
-        if "EPERIGEE" in working_array[index]["tlmsid_string"]:
+        if working_codes[index] == cec.EPERIGEE:
             # Set the state of perigee in the perigee passage dict to True
             perigee_passage_dict["eperigee_state"] = True
             
         # OORMPEN - If this is this line a RADMON ENABLE initialize the
         #                     initialize the perigee passage dict
-        if "OORMPEN" in working_array[index]["tlmsid_string"]:
+        if working_codes[index] == cec.OORMPEN:
             # Since RADMON is now enabled,  you no longer need the data stored
             # in the perigee passage dict for this perigee passage So re-init the dict. 
             perigee_passage_dict = {"radmon_dis_date": "1999:001:00:00:00.00",
@@ -232,15 +237,15 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
             # Fill in the previous obs data structure with values from the
             # state dictionary
             
-            # Extract the step value and translate that into an instrument
-            # string
+            # Translate the step value, parsed out when the commands were
+            # loaded, into an instrument string
 
             # Fill in the values that changed due to a SIM translation
-            instrument =  BFCI.Get_Instrument(working_array[index]["tlmsid_string"])
+            instrument =  BFCI.Get_Command_Instrument(working_array[index])
 
         # START SCIENCE - Is this a start science command? If so you have enough
         # information to  calculate the dwell time
-        if any( cmd in working_array[index]["tlmsid_string"] for cmd in start_science_command_list):
+        if working_codes[index] in start_science_codes:
 
             # If yes, you have enough information to calculate the Dwell Time
             dwell_stop_date = working_array[index]["date"].strip()
@@ -293,7 +298,7 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
 
 
        # AA00000000 - Is this line a Stop Science line?
-        if stop_science_command in working_array[index]["tlmsid_string"]:
+        if working_codes[index] == stop_science_code:
             # Yes. Set the dwell start date and time
             dwell_start_date = working_array[index]["date"]
             dwell_start_time = working_array[index]["time"]
@@ -302,25 +307,26 @@ if (len([index  for index,each_cmd in enumerate(rev_cmds["commands"]) if "ACISPK
         index += 1
         
     # Done finding any long dwells. If there are lines in long_dwell_list, insert
-    # them in a copy of ACIS_LoadReview.txt called ACIS_LoadReview.txt.DWELL_COMMENT
+    # them in ACIS_LoadReview.txt
     if len(long_dwell_list)> 0:
-        icia.Insert_Comment_In_ALR(long_dwell_list, load_week_path, "DWELL_COMMENTS")
+        alr_doc = ALR_Document_Class.ALR_Document_Object(load_week_path+'/ACIS-LoadReview.txt')
+        alr_doc.Add_Comments(long_dwell_list)
 
-        # Copy the updated ACIS-LoadReview.txt file
-        # If the test flag was False, then move the .DWELL_COMMENTS file to
-        # ACIS-LoadReview.txt.
-        # If it was True then we leave the original ACIS-LoadReview.txt and the
-        # ACIS-LoadReview.txt.DWELL_COMMENTS files intact for comparison.
+        # Write the updated ACIS-LoadReview.txt file
+        # If the test flag was False, then replace ACIS-LoadReview.txt with it.
+        # If it was True then we leave the original ACIS-LoadReview.txt intact
+        # and write ACIS-LoadReview.txt.DWELL_COMMENTS for comparison.
         if dwell_args.test == False:
             try:
-                print('\nMoving ACIS-LoadReview.txt.DWELL_COMMENTS to ACIS-LoadReview.txt')
-                shutil.copy(load_week_path+'/ACIS-LoadReview.txt.DWELL_COMMENTS', load_week_path+'/ACIS-LoadReview.txt')
+                print('\nWriting the dwell comments into ACIS-LoadReview.txt')
+                alr_doc.Write()
             except OSError as err:
                 print(err)
-                print('Examine the ofls directory and look for the DWELL_COMMENTS file.')
+                print('ACIS-LoadReview.txt was left unchanged.')
             else:
                 print('    Copy was successful')
         else:
+            alr_doc.Write('DWELL_COMMENTS')
             print('\nTEST MODE - Leaving the ACIS-LoadReview.txt  unchanged')
 
     else: # long_dwell_list length <= 0 Let the user know in the log file.
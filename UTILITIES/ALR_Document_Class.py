@@ -0,0 +1,267 @@
+################################################################################
+#
+# ALR_Document_Class - Class which holds an ACIS-LoadReview.txt file in
+#                      memory so that any number of checks can annotate it
+#                      and have all of their annotations written out at once.
+#
+################################################################################
+import os
+import re
+
+import numpy as np
+
+import apt_date_secs as apt
+
+"""
+The checks run after LR (Check_Power_Cmds, Window_Check, HRC_Txing_Check,
+Find_Idle_Dwells) each insert lines into ACIS-LoadReview.txt. Rather than
+each one reading the file, writing a modified copy and copying that back,
+a check creates (or is given) an ALR_Document_Object, adds its annotations
+to it, and calls Write when it is done.
+
+The file is read and its time stamps indexed once, when the object is
+created. Annotations never change self.lines; they are kept, per line,
+and merged in when the file is written. So every annotation is placed
+relative to the lines of the original file, no matter how many have been
+added before it, and annotations that go in the same place come out in
+the order they were added.
+
+Write puts the new file in place with a single rename, so a reader of
+ACIS-LoadReview.txt sees either the old file or the new one, never a
+partly written one.
+
+    e.g.
+
+    alr_doc = ALR_Document_Class.ALR_Document_Object(os.path.join(load_week_path, 'ACIS-LoadReview.txt'))
+    alr_doc.Add_Comments(comment_list)
+    alr_doc.Write()
+"""
+
+# Regular expression for lines which begin with a DOY time stamp
+time_stamp = re.compile('\\d\\d\\d\\d:\\d\\d\\d:\\d\\d:\\d\\d:\\d\\d.\\d\\d\\d')
+
+class ALR_Document_Object:
+    """
+    An ACIS-LoadReview.txt file held in memory, along with the
+    annotations to be inserted into it.
+
+    ALR_file_path - Path to the ACIS-LoadReview.txt file
+    ALR_lines - Optional list of the lines of the file. If given, the
+                file is not read.
+    """
+    def __init__(self, ALR_file_path = 'ACIS-LoadReview.txt', ALR_lines = None):
+        self.ALR_file_path = ALR_file_path
+
+        if ALR_lines is None:
+            # Open the load review text file
+            infile = open(ALR_file_path, 'r')
+
+            # Read all of the ALR.txt lines
+            ALR_lines = infile.readlines()
+
+            # Done with the input file - close it.
+            infile.close()
+
+        self.lines = ALR_lines
+
+        # For each line index, the list of lines to be inserted just before it.
+        # Index len(self.lines) is the end of the file.
+        self.annotations = {}
+
+        # Get the indices of all those lines which begin with a DOY time stamp
+        # This is the position of the time stamped line in the ALR file.
+        # Not all lines in the file begin with time stamps
+        self.time_stamped_line_indices = np.array([index for index, eachline in enumerate(self.lines) if time_stamp.match(eachline)], dtype = np.int64)
+
+        # Next, get the times in seconds for those lines which have a DOY
+        # time in them.  This is a one for one pairing of time_stamped_line_indices
+        self.event_times = apt.secs_array([self.lines[eachindex].split()[0] for eachindex in self.time_stamped_line_indices])
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Last_Stamp_Indices - Find the last time stamped line at or
+    #                              before each of a set of times
+    #
+    #---------------------------------------------------------------------------
+    def Last_Stamp_Indices(self, times, event_times = None):
+        """
+        Given an array of times, return, for each, the index into
+        self.time_stamped_line_indices of the last time stamped line whose
+        time is at or before it, or -1 if there is none.
+
+        event_times defaults to self.event_times. Pass in a modified copy
+        (e.g. truncated to the second) to compare with that instead.
+
+        The ALR times need not be in order.
+        """
+        if event_times is None:
+            event_times = self.event_times
+
+        # The earliest time from each stamped line to the end of the file.
+        # This never decreases, so it can be searched, and the last entry
+        # at or before a time is also the last stamped line at or before
+        # that time - even where the ALR times are out of order.
+        latest_times = np.minimum.accumulate(event_times[::-1])[::-1]
+
+        return np.searchsorted(latest_times, times, side = 'right') - 1
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Add_Lines_Before - Insert lines just before a line of the file
+    #
+    #---------------------------------------------------------------------------
+    def Add_Lines_Before(self, line_index, new_lines):
+        """
+        Insert the list of strings new_lines just before self.lines[line_index].
+        A line_index of len(self.lines) puts them at the end of the file.
+        Each string should end with a newline.
+        """
+        self.annotations.setdefault(line_index, []).extend(new_lines)
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Add_Lines_After - Insert lines just after a line of the file
+    #
+    #---------------------------------------------------------------------------
+    def Add_Lines_After(self, line_index, new_lines):
+        """
+        Insert the list of strings new_lines just after self.lines[line_index].
+        Each string should end with a newline.
+        """
+        self.Add_Lines_Before(line_index + 1, new_lines)
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Add_Comments - Insert time stamped comments
+    #
+    #---------------------------------------------------------------------------
+    def Add_Comments(self, comment_list):
+        """
+        Given a list of comments, each of which is a list:
+
+            [insert_date, insert_time, comment string]
+
+        insert each comment string, with a blank line before and after,
+        just before the first time stamped line after the last time
+        stamped line at or before the comment time. If that last line is
+        the last time stamped line in the file, the comment goes just
+        before it. Comments with no time stamped line at or before them
+        are dropped.
+
+        This is the placement used by Insert_Comment_In_ALR.
+        """
+        if (len(comment_list) == 0) or (len(self.time_stamped_line_indices) == 0):
+            return
+
+        comment_times = np.array([each_comment[1] for each_comment in comment_list], dtype = np.float64)
+        stamp_indices = self.Last_Stamp_Indices(comment_times)
+
+        # The comment goes before the next stamped line, unless the last
+        # stamped line is the one at or before the comment, in which case it
+        # goes before that one.
+        next_stamp_indices = np.minimum(stamp_indices + 1, len(self.time_stamped_line_indices) - 1)
+        insert_locs = self.time_stamped_line_indices[next_stamp_indices].tolist()
+
+        for comment_index, each_comment in enumerate(comment_list):
+            if stamp_indices[comment_index] >= 0:
+                self.Add_Lines_Before(insert_locs[comment_index], ["".join(("\n", each_comment[2], "\n\n"))])
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Add_Power_Command_Errors - Insert the violations found by
+    #                                    Check_Power_Cmds
+    #
+    #---------------------------------------------------------------------------
+    def Add_Power_Command_Errors(self, violations_list):
+        """
+        Given the list of violation dicts made by Check_Power_Cmds, e.g.
+
+            {'vio_date': '2018:065:21:40:36.53',
+             'vio_time': 636759705,
+             'vio_rule': 'Rule 3 - Less than 4 second delay'}
+
+        insert an error message for each, just before the last time
+        stamped line whose time, truncated to the second, is at or before
+        the time of the error. An error before the first stamped line goes
+        just before it and, if there are no stamped lines, the errors go at
+        the end. Errors that go in the same place are kept in time order.
+        """
+        if len(violations_list) == 0:
+            return
+
+        ordered_violations = sorted(violations_list, key = lambda violation: violation['vio_time'])
+
+        if len(self.time_stamped_line_indices) == 0:
+            # No time stamps at all - put the errors at the end
+            insert_locs = [len(self.lines)] * len(ordered_violations)
+        else:
+            vio_times = np.array([each_violation['vio_time'] for each_violation in ordered_violations], dtype = np.float64)
+            stamp_indices = self.Last_Stamp_Indices(vio_times, self.event_times.astype(np.int64))
+
+            # An error before the first stamped line goes just before it
+            insert_locs = self.time_stamped_line_indices[np.maximum(stamp_indices, 0)].tolist()
+
+        for insert_loc, each_violation in zip(insert_locs, ordered_violations):
+            self.Add_Lines_Before(insert_loc, ['ACISPKT AND/OR POWER COMMAND ERROR:\n',
+                                               str(each_violation['vio_date'])+' '+str(each_violation['vio_rule'])+'\n',
+                                               '\n'])
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Merged_Lines - Return the lines of the file with the
+    #                        annotations inserted
+    #
+    #---------------------------------------------------------------------------
+    def Merged_Lines(self):
+        """
+        Return a new list of the lines of the file with all of the
+        annotations merged in. Built in one pass; self.lines is unchanged.
+        """
+        merged_lines = []
+        line_index = 0
+
+        for insert_loc in sorted(self.annotations):
+            merged_lines.extend(self.lines[line_index:insert_loc])
+            line_index = max(line_index, insert_loc)
+
+            merged_lines.extend(self.annotations[insert_loc])
+
+        merged_lines.extend(self.lines[line_index:])
+
+        return merged_lines
+
+    #---------------------------------------------------------------------------
+    #
+    # Method: Write - Write the annotated file out
+    #
+    #---------------------------------------------------------------------------
+    def Write(self, extension = None):
+        """
+        Write the file, with the annotations merged in, over
+        ACIS-LoadReview.txt. If extension is given, write it to
+        ACIS-LoadReview.txt.<extension> instead and leave
+        ACIS-LoadReview.txt as it is (test mode).
+
+        The file is written to a temporary file in the same directory which
+        is then renamed, so the replacement is atomic. Returns the path of
+        the file written. OSError is raised if it can't be written.
+        """
+        if extension is None:
+            out_file_path = self.ALR_file_path
+        else:
+            out_file_path = self.ALR_file_path + "." + extension
+
+        temp_file_path = out_file_path + ".%d.tmp" % os.getpid()
+
+        try:
+            outfile = open(temp_file_path, 'w')
+            outfile.writelines(self.Merged_Lines())
+            outfile.close()
+
+            os.replace(temp_file_path, out_file_path)
+        except OSError:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise
+
+        return out_file_path
@@ -6,11 +6,24 @@
 #
 ################################################################################
 
+import hashlib
+import os
+import re
+import zipfile
+
 import numpy as np
 
 import apt_date_secs as apt
 import SIM_Class as sim_class
 
+# Bump this whenever the layout of the commands array changes so that
+# older cache files are ignored and rebuilt.
+CACHE_VERSION = 4
+
+# Directory the cache files are kept in when Read_BS_File is not given
+# one. The cache is never written into the load directories.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "backstop_file_processing")
+
 class Backstop_File_Class:
     """
     Class defined to read a specified backstop file for processing, and store
@@ -29,54 +42,326 @@ class Backstop_File_Class:
         self.ACISPKT_array = None
         self.type_array = None
 
+        # Dictionary mapping each command_type to the sorted row indices,
+        # in self.backstop_commands_array, of the commands of that type.
+        self.type_index = {}
+
         self.sim_class_instance = sim_class.SIM_utilities()
         
-        self.backstop_dtype = [("date", "|U21"), ("time", "<f8"), ("vcdu", "<i4"), ("vcdu2", "<i4"),  ("command_type", "|U13"),     ("tlmsid_string", "|U3000")]
+        # The first six columns come straight from the backstop line. The
+        # rest are parsed out of tlmsid_string when the commands are loaded:
+        #
+        #     tlmsid     - value of TLMSID= (e.g. WSPOW00000)
+        #     msid       - value of MSID= (e.g. 4OHETGIN)
+        #     event_type - value of TYPE= in ORBPOINT commands (e.g. EEF1000)
+        #     pos        - value of POS= in SIMTRANS commands
+        #     scs        - value of SCS=
+        #     step       - value of STEP=
+        #
+        # String columns are empty, and integer columns are self.no_value,
+        # when the command does not carry that parameter.
+        #
+        # The width of tlmsid_string is set, each time commands are loaded,
+        # to the length of the longest string loaded. Most strings are well
+        # under 200 characters so this is much smaller than a fixed width
+        # large enough for any command.
+        self.backstop_dtype = self.Make_Backstop_Dtype(3000)
+
+        # Value of an integer parameter column when the parameter is absent
+        self.no_value = np.iinfo(np.int32).min
+
+        # Parameter columns: keyword in the backstop string -> column name
+        self.string_parameters = {"TLMSID": "tlmsid", "MSID": "msid", "TYPE": "event_type"}
+        self.integer_parameters = {"POS": "pos", "SCS": "scs", "STEP": "step"}
         
+    #---------------------------------------------------------------------------
+    #  Method:  Make_Backstop_Dtype
+    #---------------------------------------------------------------------------
+    def Make_Backstop_Dtype(self, tlmsid_width):
+        """
+        Return the dtype of the commands array, given the number of
+        characters to allow for tlmsid_string
+        """
+        return [("date", "|U21"), ("time", "<f8"), ("vcdu", "<i4"), ("vcdu2", "<i4"),  ("command_type", "|U13"),     ("tlmsid_string", "|U%d" % tlmsid_width),
+                    ("tlmsid", "|U20"), ("msid", "|U20"), ("event_type", "|U20"), ("pos", "<i4"), ("scs", "<i4"), ("step", "<i4")]
+
     #---------------------------------------------------------------------------
     #  Method:  Read_BS_File - Read the input backstop file and store the contents
     #                                   in a class atribute
     #---------------------------------------------------------------------------
-    def Read_BS_File(self, backstop_file_path):
+    def Read_BS_File(self, backstop_file_path, use_cache = False, cache_dir = None):
         """
         Given a full path to the backstop file, read the file, calculate the
         Chandra Time, in seconds,  of each command and store the
         contents in the self.backstop_commands attribute which is a numpy
         array.
+
+        If use_cache is True the parsed array is saved in a cache file in
+        cache_dir (see Cache_File_Path), and later reads of the same,
+        unchanged, file load the cache instead of parsing. cache_dir
+        defaults to DEFAULT_CACHE_DIR.
         """
         # Store the full path to the backstop file in an attribute
         self.backstop_file_path = backstop_file_path
 
-        # Create an empty numpy array
-        self.backstop_commands_array = np.array([], dtype = self.backstop_dtype)
+        if cache_dir is None:
+            cache_dir = DEFAULT_CACHE_DIR
 
-        
-        # Open the backstop file for reading
+        # Use the cache if there is a good one
+        if use_cache and (self.Read_Cache(backstop_file_path, cache_dir) is not None):
+            return self.backstop_commands_array
+
+        # Read all of the lines at once and build the array out of them
         bsfile = open(self.backstop_file_path, "r")
+        command_lines = bsfile.readlines()
+        bsfile.close()
 
-        # Read and process each line
-        for eachline in bsfile:
-            # Split the line on "|"
-            split_line = eachline.split("|")
+        self.Process_BS_Lines(command_lines)
 
-            # Populate the new row for the array
-            new_row = np.array( [ (split_line[0].strip(),
-                              apt.secs(split_line[0].rstrip()),
-                              int(split_line[1].split()[0]),
-                              int(split_line[1].split()[1]),
-                              split_line[2].rstrip().lstrip(),
-                              split_line[3][:-1]) ], dtype = self.backstop_dtype)
-
-            # Append this new row to  self.backstop_commands_array
-            self.backstop_commands_array = np.append(self.backstop_commands_array,
-                                                                                      new_row, axis = 0)
-            
-        # Done reading the file - close it
-        bsfile.close()
+        # Save the parsed commands for next time
+        if use_cache:
+            self.Write_Cache(backstop_file_path, cache_dir)
 
         # Return the populated numpy array of backstop commands
         return self.backstop_commands_array
 
+    #---------------------------------------------------------------------------
+    #  Method:  Process_BS_Lines
+    #---------------------------------------------------------------------------
+    def Process_BS_Lines(self, command_lines):
+        """
+        Given the lines of a backstop file, as a list, calculate the
+        Chandra Time, in seconds, of each command and store the commands
+        in the self.backstop_commands_array attribute, just as
+        Read_BS_File does for a file.
+        """
+        dates, vcdus, vcdu2s, command_types, tlmsid_strings = self.Split_Command_Lines(command_lines)
+
+        # Build the array, converting all of the dates to Chandra seconds at once
+        self.backstop_commands_array = self.Build_Commands_Array(dates,
+                                                                 apt.secs_array(dates),
+                                                                 vcdus,
+                                                                 vcdu2s,
+                                                                 command_types,
+                                                                 tlmsid_strings)
+
+        # Return the populated numpy array of backstop commands
+        return self.backstop_commands_array
+
+    #---------------------------------------------------------------------------
+    #  Method:  Cache_File_Path
+    #---------------------------------------------------------------------------
+    def Cache_File_Path(self, backstop_file_path, cache_dir):
+        """
+        Return the path of the cache file, in cache_dir, for the given
+        backstop file. The name is the name of the backstop file plus the
+        start of a hash of its full path, so that backstop files with the
+        same name in different load directories get different cache files
+        (e.g. CR064_0000.backstop.3f2a9c41d07e.npz)
+        """
+        path_hash = hashlib.sha256(os.path.abspath(backstop_file_path).encode()).hexdigest()[:12]
+
+        return os.path.join(cache_dir, ".".join((os.path.basename(backstop_file_path), path_hash, "npz")))
+
+    #---------------------------------------------------------------------------
+    #  Method:  Hash_File
+    #---------------------------------------------------------------------------
+    def Hash_File(self, file_path):
+        """
+        Return the SHA-256 hex digest of the contents of the file
+        """
+        file_hash = hashlib.sha256()
+
+        infile = open(file_path, "rb")
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            file_hash.update(chunk)
+        infile.close()
+
+        return file_hash.hexdigest()
+
+    #---------------------------------------------------------------------------
+    #  Method:  Read_Cache
+    #---------------------------------------------------------------------------
+    def Read_Cache(self, backstop_file_path, cache_dir):
+        """
+        Load the commands array from the cache file, in cache_dir, of the
+        given backstop file, if there is one and it is still good.
+
+        The cache is good if it was written by this version of the code
+        and the backstop file has the same size and either the same
+        modification time or the same SHA-256 hash as when the cache was
+        written. The hash is only computed when the modification time has
+        changed, so an untouched file is never read at all.
+
+        Returns the commands array, which is also stored in
+        self.backstop_commands_array, or None if the cache could not be used.
+        """
+        cache_file_path = self.Cache_File_Path(backstop_file_path, cache_dir)
+
+        if not os.path.isfile(cache_file_path):
+            return None
+
+        backstop_stat = os.stat(backstop_file_path)
+
+        # A cache file which can't be read is treated as missing
+        try:
+            cache = np.load(cache_file_path, allow_pickle = False)
+            cache_version = int(cache["cache_version"])
+            size = int(cache["size"])
+            mtime_ns = int(cache["mtime_ns"])
+            sha256 = str(cache["sha256"])
+            commands = cache["commands"]
+            cache.close()
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        if (cache_version != CACHE_VERSION) or (size != backstop_stat.st_size):
+            return None
+
+        # If only the modification time changed (e.g. the file was copied)
+        # check the contents and, if they are the same, rewrite the cache
+        # with the new time so that the hash isn't needed next time.
+        refresh_cache = False
+
+        if mtime_ns != backstop_stat.st_mtime_ns:
+            if sha256 != self.Hash_File(backstop_file_path):
+                return None
+            refresh_cache = True
+
+        self.backstop_dtype = commands.dtype.descr
+        self.backstop_commands_array = commands
+        self.type_index = self.Build_Type_Index(self.backstop_commands_array)
+
+        if refresh_cache:
+            self.Write_Cache(backstop_file_path, cache_dir)
+
+        return self.backstop_commands_array
+
+    #---------------------------------------------------------------------------
+    #  Method:  Write_Cache
+    #---------------------------------------------------------------------------
+    def Write_Cache(self, backstop_file_path, cache_dir):
+        """
+        Save self.backstop_commands_array, along with the size,
+        modification time and SHA-256 hash of the backstop file, to the
+        cache file, in cache_dir, of the backstop file. cache_dir is
+        created if need be.
+
+        The cache is written to a temporary file which is then renamed,
+        so a reader never sees a partly written cache. If the cache can't
+        be written (e.g. cache_dir is read only) nothing is saved and no
+        error is raised.
+        """
+        cache_file_path = self.Cache_File_Path(backstop_file_path, cache_dir)
+        temp_file_path = cache_file_path + ".%d.tmp" % os.getpid()
+
+        try:
+            os.makedirs(cache_dir, exist_ok = True)
+
+            backstop_stat = os.stat(backstop_file_path)
+
+            cache_file = open(temp_file_path, "wb")
+            np.savez(cache_file,
+                     cache_version = CACHE_VERSION,
+                     size = backstop_stat.st_size,
+                     mtime_ns = backstop_stat.st_mtime_ns,
+                     sha256 = self.Hash_File(backstop_file_path),
+                     commands = self.backstop_commands_array)
+            cache_file.close()
+
+            os.replace(temp_file_path, cache_file_path)
+        except OSError:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    #---------------------------------------------------------------------------
+    #  Method:  Build_Commands_Array
+    #---------------------------------------------------------------------------
+    def Build_Commands_Array(self, dates, times, vcdus, vcdu2s, command_types, tlmsid_strings):
+        """
+        Given the six backstop columns as lists or arrays, allocate the
+        commands array once and fill it in column by column. The parameter
+        columns are parsed out of the TLMSID strings and the command type
+        index is built.
+
+        Returns the new array, which is also stored in self.backstop_commands_array
+        """
+        # Make tlmsid_string just wide enough for the longest string
+        tlmsid_width = max([len(each_string) for each_string in tlmsid_strings], default = 1)
+        self.backstop_dtype = self.Make_Backstop_Dtype(max(tlmsid_width, 1))
+
+        self.backstop_commands_array = np.zeros(len(dates), dtype = self.backstop_dtype)
+
+        self.backstop_commands_array["date"] = dates
+        self.backstop_commands_array["time"] = times
+        self.backstop_commands_array["vcdu"] = vcdus
+        self.backstop_commands_array["vcdu2"] = vcdu2s
+        self.backstop_commands_array["command_type"] = command_types
+        self.backstop_commands_array["tlmsid_string"] = tlmsid_strings
+
+        # Parse the parameters out of the TLMSID strings
+        self.Fill_Parameter_Columns(self.backstop_commands_array)
+
+        # Index the rows by command type
+        self.type_index = self.Build_Type_Index(self.backstop_commands_array)
+
+        return self.backstop_commands_array
+
+    #---------------------------------------------------------------------------
+    #  Method:  Parse_Parameters
+    #---------------------------------------------------------------------------
+    def Parse_Parameters(self, tlmsid_string):
+        """
+        Given a backstop TLMSID string, e.g.:
+
+            TLMSID= WSPOW00000, CMDS= 3, WORDS= 3, PACKET(40)= D80000300030603001300, SCS= 131, STEP= 25
+
+        return a dictionary of the KEY= value pairs it contains:
+
+            {"TLMSID": "WSPOW00000", "CMDS": "3", ... "STEP": "25"}
+
+        Keys are upper case and values are stripped strings.
+        """
+        parameters = {}
+
+        for each_item in tlmsid_string.split(","):
+            # Skip anything that is not of the form KEY= value
+            if "=" in each_item:
+                key, value = each_item.split("=", 1)
+                parameters[key.strip().upper()] = value.strip()
+
+        return parameters
+
+    #---------------------------------------------------------------------------
+    #  Method:  Fill_Parameter_Columns
+    #---------------------------------------------------------------------------
+    def Fill_Parameter_Columns(self, commands):
+        """
+        Parse the tlmsid_string of every command in the array once and fill
+        in the tlmsid, msid, event_type, pos, scs and step columns.
+        """
+        # One list per parameter column
+        string_columns = {each_name: [] for each_name in self.string_parameters.values()}
+        integer_columns = {each_name: [] for each_name in self.integer_parameters.values()}
+
+        for each_string in commands["tlmsid_string"]:
+            parameters = self.Parse_Parameters(each_string)
+
+            for key, column_name in self.string_parameters.items():
+                string_columns[column_name].append(parameters.get(key, ""))
+
+            for key, column_name in self.integer_parameters.items():
+                try:
+                    integer_columns[column_name].append(int(parameters[key]))
+                except (KeyError, ValueError):
+                    integer_columns[column_name].append(self.no_value)
+
+        for column_name, values in string_columns.items():
+            commands[column_name] = values
+
+        for column_name, values in integer_columns.items():
+            commands[column_name] = values
+
        
     #---------------------------------------------------------------------------
     #  Method:  Process_BSH_Array
@@ -90,31 +375,287 @@ class Backstop_File_Class:
         in seconds of each command so this routine doesn't have to do that.
         """
         
-        # Create an empty numpy array
-        self.backstop_commands_array = np.array([], dtype = self.backstop_dtype)
+        # Split the whole commands column into columns at once
+        line_dates, vcdus, vcdu2s, command_types, tlmsid_strings = self.Split_Command_Lines(bsh_array["commands"])
+
+        # Build the array using the dates and times Backstop History worked out
+        self.backstop_commands_array = self.Build_Commands_Array(bsh_array["date"],
+                                                                 bsh_array["time"],
+                                                                 vcdus,
+                                                                 vcdu2s,
+                                                                 command_types,
+                                                                 tlmsid_strings)
+
+        # Return the populated numpy array of backstop commands
+        return self.backstop_commands_array
+
+    #---------------------------------------------------------------------------
+    #  Method:  Split_Command_Lines
+    #---------------------------------------------------------------------------
+    def Split_Command_Lines(self, command_lines):
+        """
+        Given a list or array of backstop command lines, split all of them
+        at once into the columns of the backstop file:
+
+            date | vcdu vcdu2 | command_type | tlmsid_string
 
-        # Process each command
-        for each_cmd in bsh_array:
-            # Split the command column entry on "|"
-            split_line = each_cmd["commands"].split("|")
+        Rather than splitting each line in turn, the lines are joined with
+        "|" and the result is split once, which gives four fields per line.
+        Every fourth field then makes up a column. The VCDU pairs are
+        handled the same way.
 
-            # Populate the new row for the array
-            new_row = np.array( [ (each_cmd["date"],
-                                               each_cmd["time"],
-                                               int(split_line[1].split()[0]),
-                                               int(split_line[1].split()[1]),
-                                               split_line[2].rstrip().lstrip(),
-                                               split_line[3][:-1]) ], dtype = self.backstop_dtype)
+        This is only done if every line has exactly three "|" and the
+        VCDU sections hold two values per line. Otherwise a line with
+        too many sections could make up for one with too few, so the
+        lines are split one at a time instead.
 
-            # Append this new row to  self.backstop_commands_array
-            self.backstop_commands_array = np.append(self.backstop_commands_array,
-                                                                                      new_row, axis = 0)
-            
+        Returns lists of the dates, vcdus, vcdu2s, command types and
+        TLMSID strings. The last character, the newline, is dropped from
+        each TLMSID string.
+        """
+        if isinstance(command_lines, np.ndarray):
+            command_lines = command_lines.tolist()
+
+        if (len(command_lines) > 0) and all(each_line.count("|") == 3 for each_line in command_lines):
+            fields = "|".join(command_lines).split("|")
+            vcdu_values = " ".join(fields[1::4]).split()
+
+            if len(vcdu_values) == 2 * len(command_lines):
+                dates = [each_field.strip() for each_field in fields[0::4]]
+                vcdus = [int(each_value) for each_value in vcdu_values[0::2]]
+                vcdu2s = [int(each_value) for each_value in vcdu_values[1::2]]
+                command_types = [each_field.strip() for each_field in fields[2::4]]
+                tlmsid_strings = [each_field[:-1] for each_field in fields[3::4]]
+
+                return dates, vcdus, vcdu2s, command_types, tlmsid_strings
+
+        # Column lists which are filled in a single pass through the lines
+        dates = []
+        vcdus = []
+        vcdu2s = []
+        command_types = []
+        tlmsid_strings = []
+
+        for eachline in command_lines:
+            # Split the line on "|"
+            split_line = eachline.split("|")
+
+            # The second section holds the two VCDU values
+            vcdu_split = split_line[1].split()
 
+            # Populate the columns for this row
+            dates.append(split_line[0].strip())
+            vcdus.append(int(vcdu_split[0]))
+            vcdu2s.append(int(vcdu_split[1]))
+            command_types.append(split_line[2].rstrip().lstrip())
+            tlmsid_strings.append(split_line[3][:-1])
+
+        return dates, vcdus, vcdu2s, command_types, tlmsid_strings
+
+    #---------------------------------------------------------------------------
+    #  Method:  Collect_Commands
+    #---------------------------------------------------------------------------
+    def Collect_Commands(self, command_rows):
+        """
+        Given an iterable of command rows, such as the output of
+        iter_commands, build the commands array out of them and store it
+        in the self.backstop_commands_array attribute.
+
+        Each row is a dict with the keys date, vcdu, vcdu2, command_type
+        and tlmsid_string. The times of all of the commands are
+        calculated from their dates in one call once the rows have been
+        collected.
+        """
+        # Column lists which are filled in a single pass through the rows
+        dates = []
+        vcdus = []
+        vcdu2s = []
+        command_types = []
+        tlmsid_strings = []
+
+        for each_row in command_rows:
+            dates.append(each_row["date"])
+            vcdus.append(each_row["vcdu"])
+            vcdu2s.append(each_row["vcdu2"])
+            command_types.append(each_row["command_type"])
+            tlmsid_strings.append(each_row["tlmsid_string"])
+
+        self.backstop_commands_array = self.Build_Commands_Array(dates,
+                                                                 apt.secs_array(dates),
+                                                                 vcdus,
+                                                                 vcdu2s,
+                                                                 command_types,
+                                                                 tlmsid_strings)
 
         # Return the populated numpy array of backstop commands
         return self.backstop_commands_array
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: Build_Type_Index
+    #
+    #---------------------------------------------------------------------------
+    def Build_Type_Index(self, commands):
+        """
+        Given an array of commands in the backstop dtype, return a dictionary
+        whose keys are the command types that appear in the array and whose
+        values are numpy arrays of the row indices of the commands of that
+        type, in ascending order.
+        """
+        # Number each distinct command type and tag each row with its number
+        types, type_codes = np.unique(commands["command_type"], return_inverse = True)
+
+        # A stable sort on the type number keeps the rows of each type in
+        # their original order. Then cut the sorted rows up by type.
+        sorted_rows = np.argsort(type_codes, kind = "stable")
+        type_counts = np.bincount(type_codes, minlength = len(types))
+        row_groups = np.split(sorted_rows, np.cumsum(type_counts)[:-1])
+
+        return dict(zip(types.tolist(), row_groups))
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: Get_Type_Index
+    #
+    #---------------------------------------------------------------------------
+    def Get_Type_Index(self, commands):
+        """
+        Return the type index for the array commands. The index built at load
+        time is reused for self.backstop_commands_array; any other array
+        gets a new one.
+        """
+        if commands is self.backstop_commands_array:
+            return self.type_index
+
+        return self.Build_Type_Index(commands)
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: Type_Rows
+    #
+    #---------------------------------------------------------------------------
+    def Type_Rows(self, type_list, commands):
+        """
+        Return the sorted row indices of those commands, in the array
+        commands, whose command_type is in type_list.
+
+        If commands is self.backstop_commands_array the type index built
+        when the commands were loaded is used, so the cost depends only
+        on the number of matching commands. Otherwise an index is built
+        for the array that was passed in.
+        """
+        type_index = self.Get_Type_Index(commands)
+
+        # Collect the rows of each matching type and put them back in order
+        row_groups = [rows for each_type, rows in type_index.items() if each_type in type_list]
+
+        if len(row_groups) == 0:
+            return np.array([], dtype = np.intp)
+
+        return np.sort(np.concatenate(row_groups))
         
+    #---------------------------------------------------------------------------
+    #
+    #  Method: Time_Rows
+    #
+    #---------------------------------------------------------------------------
+    def Time_Rows(self, tstart, tstop, commands):
+        """
+        Return the first row at or after tstart and the first row at or
+        after tstop, in the array commands, so that
+        commands[start_row:stop_row] are the commands in [tstart, tstop).
+
+        tstart and tstop can be Chandra seconds or DOY strings. If tstart
+        is None the range starts with the first command, and if tstop is
+        None it runs through the last.
+
+        The rows are found by a binary search of the time column, which
+        must be in time order, as it is for backstop files and for the
+        arrays made by Backstop History.
+        """
+        times = commands["time"]
+
+        if tstart is None:
+            start_row = 0
+        else:
+            start_row = np.searchsorted(times, apt.secs(tstart) if isinstance(tstart, str) else float(tstart), side = "left")
+
+        if tstop is None:
+            stop_row = len(times)
+        else:
+            stop_row = np.searchsorted(times, apt.secs(tstop) if isinstance(tstop, str) else float(tstop), side = "left")
+
+        return start_row, max(start_row, stop_row)
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: slice_time
+    #
+    #---------------------------------------------------------------------------
+    def slice_time(self, tstart = None, tstop = None, commands = []):
+        """
+        Return the commands whose times are at or after tstart and before
+        tstop. See Time_Rows for the allowed values of tstart and tstop.
+
+        If commands are not specified in the call the method defaults to
+        self.backstop_commands_array. Any array with a time column in
+        time order can be given, including a Backstop History array.
+
+        The result is a slice, not a copy, of commands.
+        """
+        # If the user did not specify a source of commands
+        # then default to self.backstop_commands_array
+        if len(commands) == 0:
+            commands = self.backstop_commands_array
+
+        start_row, stop_row = self.Time_Rows(tstart, tstop, commands)
+
+        return commands[start_row:stop_row]
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: state_before
+    #
+    #---------------------------------------------------------------------------
+    def state_before(self, t, command_type = None, commands = []):
+        """
+        Return the last command before time t, or None if there isn't one.
+        t can be Chandra seconds or a DOY string.
+
+        If command_type is given (e.g. "SIMTRANS") the last command of that
+        type before t is returned instead. The rows of that type come from
+        the type index so only they are searched. Without a command_type
+        the time column itself is searched, which takes O(log n) time.
+
+        If commands are not specified in the call the method defaults to
+        self.backstop_commands_array.
+        """
+        # If the user did not specify a source of commands
+        # then default to self.backstop_commands_array
+        if len(commands) == 0:
+            commands = self.backstop_commands_array
+
+        t_secs = apt.secs(t) if isinstance(t, str) else float(t)
+
+        if command_type is None:
+            # Search the whole time column; no row list is needed
+            before_count = np.searchsorted(commands["time"], t_secs, side = "left")
+
+            if before_count == 0:
+                return None
+
+            return commands[before_count - 1]
+
+        rows = self.Type_Rows([command_type], commands)
+
+        # The number of the rows of that type which are before t
+        before_count = np.searchsorted(commands["time"][rows], t_secs, side = "left")
+
+        if before_count == 0:
+            return None
+
+        return commands[rows[before_count - 1]]
+
     #---------------------------------------------------------------------------
     #
     #  Method: Extract_TLMSID_Value
@@ -125,10 +666,15 @@ class Backstop_File_Class:
         Given a command of the data structure self.backstop_commands_array
         extract and return the value that TLMSID is equal to in the "tlmsid_string"
         """
+        # The value was parsed out when the commands were loaded
+        if command["tlmsid"]:
+            return command["tlmsid"]
+
+        # Commands without a TLMSID: the value of the first parameter
         # Split the string on spaces
         split_string = command["tlmsid_string"].split()
 
-        # Extract the value that "TLMSID is set equal to, being sure to remove
+        # Extract the value of the first parameter, being sure to remove
         # the comma at the end and strip out all spaces
         extracted_tlmsid_val = split_string[1][:-1].strip()
 
@@ -156,26 +702,8 @@ class Backstop_File_Class:
         if len(commands) == 0:
             commands = self.backstop_commands_array
 
-        # Create an empty ACISPKT_array
-        self.ACISPKT_array = np.array([], dtype = self.backstop_dtype)
-
-
-        
-        # Scan the commands array and look for the commands which are
-        # of type "ACISPKT"
-        for each_row in commands:
-            if each_row["command_type"] == "ACISPKT":
-                # Populate  the new row
-                new_row = np.array([(each_row["date"],
-                                                    each_row["time"],
-                                                   each_row["vcdu"],
-                                                   each_row["vcdu2"],
-                                                   each_row["command_type"],
-                                                   each_row["tlmsid_string"],
-                                                    )], dtype = self.backstop_dtype)
-
-                # Append the new row to  the ACISPKT array
-                self.ACISPKT_array = np.append(self.ACISPKT_array, new_row, axis = 0)
+        # Pull out the ACISPKT rows in a single step
+        self.ACISPKT_array = commands[self.Type_Rows(["ACISPKT"], commands)]
 
         # Return the ACISPKT array
         return self.ACISPKT_array
@@ -207,24 +735,8 @@ class Backstop_File_Class:
         if len(commands) == 0:
             commands = self.backstop_commands_array
 
-        # Create an empty type_array
-        self.type_array = np.array([], dtype = self.backstop_dtype)
-
-        # Scan the commands array and look for the commands which are of any
-        # of the types in the list
-        for each_row in commands:
-            if each_row["command_type"] in type_list:
-                # Populate  the new row
-                new_row = np.array([(each_row["date"],
-                                                    each_row["time"],
-                                                   each_row["vcdu"],
-                                                   each_row["vcdu2"],
-                                                   each_row["command_type"],
-                                                   each_row["tlmsid_string"],
-                                                    )], dtype = self.backstop_dtype)
-
-                # Append the new row to  the type array
-                self.type_array = np.append(self.type_array, new_row, axis = 0)
+        # Pull out the rows of any of the types in the list in a single step
+        self.type_array = commands[self.Type_Rows(type_list, commands)]
 
         # Return the collected array
         return self.type_array
@@ -235,7 +747,7 @@ class Backstop_File_Class:
     #  Method:  Extract_Type_and_TLMSID
     #                                                
     #---------------------------------------------------------------------------
-    def Extract_Type_and_TLMSID(self, string_list, commands = []):
+    def Extract_Type_and_TLMSID(self, string_list, commands = [], return_tokens = False):
         """"
         Given the contents of a CR* or VR* backstop file have been read in,
         and stored in the attribute: self.backstop_commands_array, extract
@@ -245,40 +757,68 @@ class Backstop_File_Class:
         If commands are not specified in the call the method defaults to
         self.backstop_commands_array.
 
-        Results are placed in the attribute: self.type_array
+        Each command appears once, in time order, no matter how many of
+        the strings it contains. NOTE: this is a change from earlier
+        versions, which returned a copy of the command for every string
+        it contained, so a command matching two strings came back twice.
+        Callers which counted matches per string should use the matched
+        tokens (return_tokens = True) instead.
 
-        Returns an array containing just those commands.
+        Results are placed in the attribute: self.extracted_command_array
+
+        Returns an array containing just those commands. If return_tokens
+        is True, also returns an array giving, for each of those commands,
+        the string it matched (see Match_Tokens).
         """
         # If the user did not specify a source of commands from which to extract
         # then default to self.backstop_commands_array
         if len(commands) == 0:
             commands = self.backstop_commands_array
 
-        # Create an empty command_array
-        self.extracted_command_array = np.array([], dtype = self.backstop_dtype)
-
-        # Scan the commands array and look for each string in either the command
-        # type or the TLMSID string
-        for each_cmd in commands:
-            for each_string in string_list:
-                if (each_string in each_cmd["command_type"]) or \
-                   (each_string in each_cmd["tlmsid_string"]):
-                    # Populate  the new row
-                    new_row = np.array([(each_cmd["date"],
-                                                        each_cmd["time"],
-                                                       each_cmd["vcdu"],
-                                                       each_cmd["vcdu2"],
-                                                       each_cmd["command_type"],
-                                                       each_cmd["tlmsid_string"],
-                                                        )], dtype = self.backstop_dtype)
-    
-                    # Append the new row to  the extracted commands array
-                    self.extracted_command_array = np.append(self.extracted_command_array, new_row, axis = 0)
-    
+        rows, matched_tokens = self.Match_Tokens(string_list, commands)
+
+        self.extracted_command_array = commands[rows]
+
         # Return the extracted commands array
+        if return_tokens:
+            return self.extracted_command_array, matched_tokens
+
         return self.extracted_command_array
-    
 
+    #---------------------------------------------------------------------------
+    #  Method:  Match_Tokens
+    #---------------------------------------------------------------------------
+    def Match_Tokens(self, string_list, commands):
+        """
+        Find the commands which contain any of the strings in string_list
+        in either the command type or the TLMSID string.
+
+        All of the strings are compiled into a single regular expression
+        so each command is checked once, rather than once per string.
+
+        Returns two arrays:
+            - the row indices of the matching commands, in order
+            - the string that each of those commands matched. The command
+              type is checked before the TLMSID string. Within either one
+              the earliest match wins, and if two strings match at the
+              same place the one earlier in string_list wins.
+        """
+        if len(string_list) == 0:
+            return np.array([], dtype = np.intp), np.array([], dtype = "|U1")
+
+        pattern = re.compile("|".join([re.escape(each_string) for each_string in string_list]))
+
+        rows = []
+        matched_tokens = []
+
+        for row, (command_type, tlmsid_string) in enumerate(zip(commands["command_type"].tolist(),
+                                                                commands["tlmsid_string"].tolist())):
+            match = pattern.search(command_type) or pattern.search(tlmsid_string)
+            if match:
+                rows.append(row)
+                matched_tokens.append(match.group())
+
+        return np.array(rows, dtype = np.intp), np.array(matched_tokens, dtype = "|U%d" % max([len(each_string) for each_string in string_list]))
 
     #---------------------------------------------------------------------------
     #
@@ -330,3 +870,127 @@ class Backstop_File_Class:
         return instrument
     
         
+
+    #---------------------------------------------------------------------------
+    #
+    #  Method: Get_Command_Instrument - Given a SIMTRANS command row
+    #                                                         Return which instrument is in the focal plane
+    #                                                         as a string.
+    #---------------------------------------------------------------------------
+    def Get_Command_Instrument(self, command):
+        """
+        Same as Get_Instrument but takes the SIMTRANS command row itself
+        and uses the pos column parsed out when the commands were loaded,
+        so the tlmsid_string is not split again.
+
+        input: SIMTRANS row from a command array in this class
+
+        output: A string indicating which instrument is in the focal plane
+        """
+        return self.sim_class_instance.Get_Instrument(command["pos"])
+
+#-------------------------------------------------------------------------------
+#
+#  Function: iter_commands
+#
+#-------------------------------------------------------------------------------
+def iter_commands(backstop_file_path, types = None, tokens = None, tmin = None, tmax = None):
+    """
+    Generator which reads a backstop file, or a CR*.backstop.hist file,
+    one line at a time and yields only the commands which pass the
+    filters. Nothing but the current line is held in memory.
+
+    inputs: backstop_file_path - Full path to the file
+                         types - List of command types to keep
+                                 (e.g. ["ACISPKT", "SIMTRANS"])
+                        tokens - List of strings. A command is kept if any
+                                 of them appears in its command type or
+                                 its TLMSID string. Same matching as
+                                 Extract_Type_and_TLMSID.
+                          tmin - Keep commands at or after this time
+                          tmax - Keep commands before this time
+
+            tmin and tmax can be Chandra seconds or DOY strings.
+            Any filter left as None is not applied. A command has to pass
+            every filter that is applied.
+
+    output: One dict per command with the keys date, vcdu, vcdu2,
+            command_type and tlmsid_string. These are the same values as
+            the matching columns of the array made by Read_BS_File. The
+            time of each command is not worked out here; Collect_Commands
+            converts all of the dates at once.
+
+    The filters are applied from cheapest to most expensive so that lines
+    which are not wanted are thrown away before they are fully parsed:
+
+        - tokens are first looked for in the raw line
+        - the time limits are compared with the date at the start of the
+          line, truncated to the second. DOY strings of this length sort
+          in time order so no conversion is needed. Only a command in the
+          same second as tmin or tmax has its date converted, to compare
+          the exact times.
+        - only then is the line split, and the exact tests done
+
+    Backstop files are in time order, so reading stops at the first
+    command at or after tmax. The file is closed when the generator
+    finishes or is closed, even if the caller stops early.
+    """
+    # Work out each time limit in seconds, plus the DOY string of the
+    # limit truncated to the second for the quick test on the raw line
+    if tmin is not None:
+        tmin_secs = apt.secs(tmin) if isinstance(tmin, str) else float(tmin)
+        tmin_prefix = apt.date(tmin_secs)[:17]
+
+    if tmax is not None:
+        tmax_secs = apt.secs(tmax) if isinstance(tmax, str) else float(tmax)
+        tmax_prefix = apt.date(tmax_secs)[:17]
+
+    # Open the backstop file for reading
+    with open(backstop_file_path, "r") as bsfile:
+        # Read and filter each line
+        for eachline in bsfile:
+            # Quick test for the tokens on the raw line
+            if (tokens is not None) and not any(each_token in eachline for each_token in tokens):
+                continue
+
+            # Quick test of the time limits on the date prefix. A command in
+            # an earlier whole second than tmin can be skipped, and one in a
+            # later whole second than tmax ends the read.
+            date_prefix = eachline[:17]
+
+            if (tmin is not None) and (date_prefix < tmin_prefix):
+                continue
+
+            if (tmax is not None) and (date_prefix > tmax_prefix):
+                break
+
+            # Split the line on "|"
+            split_line = eachline.split("|")
+            command_type = split_line[2].strip()
+            tlmsid_string = split_line[3][:-1]
+
+            if (types is not None) and (command_type not in types):
+                continue
+
+            # The token may have matched some other part of the line, such as
+            # the date or VCDU. Check it against the type and TLMSID string.
+            if (tokens is not None) and not any((each_token in command_type) or (each_token in tlmsid_string) for each_token in tokens):
+                continue
+
+            # Exact time tests, only needed in the same second as a limit
+            date = split_line[0].strip()
+
+            if (tmin is not None) and (date_prefix == tmin_prefix) and (apt.secs(date) < tmin_secs):
+                continue
+
+            if (tmax is not None) and (date_prefix == tmax_prefix) and (apt.secs(date) >= tmax_secs):
+                break
+
+            # The second section holds the two VCDU values
+            vcdu_split = split_line[1].split()
+
+            yield {"date": date,
+                   "vcdu": int(vcdu_split[0]),
+                   "vcdu2": int(vcdu_split[1]),
+                   "command_type": command_type,
+                   "tlmsid_string": tlmsid_string}
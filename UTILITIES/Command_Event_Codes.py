@@ -0,0 +1,115 @@
+################################################################################
+#
+# Command_Event_Codes - Classify backstop commands into integer event codes
+#
+################################################################################
+import re
+
+import numpy as np
+
+"""
+The checks which walk the assembled command history (Deadman_Check,
+HETG_Check, HRC_Txing_Check, Find_Idle_Dwells) are only interested in a
+handful of commands and events. Rather than each of them testing every
+command string for each of those with a chain of
+
+    if 'X' in each_cmd['commands']:
+    elif 'Y' in each_cmd['commands']:
+    ...
+
+they call Classify_Commands once, on the whole column of command strings,
+and branch on the integer code of each command:
+
+    event_codes = cec.Classify_Commands(assembled_commands['commands'])
+
+    for each_cmd, event_code in zip(assembled_commands, event_codes):
+        if event_code == cec.SCS155_ENABLE:
+            ...
+
+Each command gets exactly one code. If a command string contains more
+than one of the tokens, the one which comes first in event_tokens wins.
+Commands which contain none of them get NO_EVENT.
+"""
+
+# The event codes
+NO_EVENT = 0
+SCS155_ENABLE = 1
+SCS155_ACTIVATE = 2
+SCS155_DISABLE = 3
+SCS134_ACTIVATE = 4
+HRC_15V_OFF = 5
+HETG_INSERT = 6
+HETG_RETRACT = 7
+EQF013M = 8
+EEF1000 = 9
+XQF013M = 10
+XEF1000 = 11
+EPERIGEE = 12
+OORMPDS = 13
+OORMPEN = 14
+STOP_SCIENCE = 15
+START_SCIENCE_TE = 16
+START_SCIENCE_CC = 17
+PARAMETER_BLOCK = 18
+ACISPKT = 19
+
+# The token, found anywhere in the command string, which identifies each
+# event, in order of priority.
+event_tokens = [('COENAS1=155', SCS155_ENABLE),
+                ('COACTS1=155', SCS155_ACTIVATE),
+                ('CODISAS1=155', SCS155_DISABLE),
+                ('COACTS1=134', SCS134_ACTIVATE),
+                ('215PCAOF', HRC_15V_OFF),
+                ('MSID= 4OHETGIN', HETG_INSERT),
+                ('MSID= 4OHETGRE', HETG_RETRACT),
+                ('EQF013M', EQF013M),
+                ('EEF1000', EEF1000),
+                ('XQF013M', XQF013M),
+                ('XEF1000', XEF1000),
+                ('EPERIGEE', EPERIGEE),
+                ('OORMPDS', OORMPDS),
+                ('OORMPEN', OORMPEN),
+                ('AA00000000', STOP_SCIENCE),
+                ('XTZ0000005', START_SCIENCE_TE),
+                ('XCZ0000005', START_SCIENCE_CC),
+                ('TLMSID= WT', PARAMETER_BLOCK),
+                ('TLMSID= WC', PARAMETER_BLOCK),
+                ('ACISPKT', ACISPKT)]
+
+# The codes of all the ACISPKT commands
+ACISPKT_CODES = (STOP_SCIENCE, START_SCIENCE_TE, START_SCIENCE_CC, PARAMETER_BLOCK, ACISPKT)
+
+# Priority of each token - lower wins
+token_priority = {token: priority for priority, (token, event_code) in enumerate(event_tokens)}
+
+# One regular expression which finds every token in a string. The
+# lookahead lets tokens which overlap each be found.
+token_search = re.compile('(?=(' + '|'.join(re.escape(token) for token, event_code in event_tokens) + '))')
+
+#-------------------------------------------------------------------------------
+#
+# Classify_Command
+#
+#-------------------------------------------------------------------------------
+def Classify_Command(command_string):
+    """
+    Return the event code of a single command string.
+    """
+    found_tokens = token_search.findall(command_string)
+
+    if not found_tokens:
+        return NO_EVENT
+
+    return event_tokens[min(token_priority[token] for token in found_tokens)][1]
+
+#-------------------------------------------------------------------------------
+#
+# Classify_Commands
+#
+#-------------------------------------------------------------------------------
+def Classify_Commands(command_strings):
+    """
+    Given a list, or numpy array, of command strings, return a numpy array
+    of the event code of each. Each string is scanned once.
+    """
+    return np.array([Classify_Command(command_string) for command_string in command_strings], dtype = np.int16)
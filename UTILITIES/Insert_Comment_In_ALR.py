@@ -1,9 +1,41 @@
 import os
-import re
-import shutil
 
-import apt_date_secs as apt
+import ALR_Document_Class
 
+#-------------------------------------------------------------------------------
+#
+# Insert_Comments_In_Lines
+#
+#-------------------------------------------------------------------------------
+def Insert_Comments_In_Lines(comment_list, ALR_lines):
+    """
+    Same as Insert_Comment_In_ALR but works on a list of
+    ACIS-LoadReview.txt lines in memory instead of on the file. The
+    comments are inserted into ALR_lines, which is also returned.
+
+    Each comment goes just before the first time stamped line after the
+    last time stamped line at or before the comment time. If that last
+    line is the last time stamped line in the file, the comment goes
+    just before it. Comments with no time stamped line at or before them
+    are dropped. Comments which go in the same place keep the order they
+    have in comment_list.
+
+    The placement is done by ALR_Document_Class.ALR_Document_Object,
+    which indexes the time stamps once and merges the comments into the
+    lines in one pass.
+    """
+    alr_doc = ALR_Document_Class.ALR_Document_Object(ALR_lines = ALR_lines)
+    alr_doc.Add_Comments(comment_list)
+
+    ALR_lines[:] = alr_doc.Merged_Lines()
+
+    return ALR_lines
+
+#-------------------------------------------------------------------------------
+#
+# Insert_Comment_In_ALR
+#
+#-------------------------------------------------------------------------------
 def Insert_Comment_In_ALR( comment_list, ALR_path, extension = "COMMENTS"):
     
     """
@@ -32,80 +64,22 @@ def Insert_Comment_In_ALR( comment_list, ALR_path, extension = "COMMENTS"):
     Update: July 27, 2023
                  Handled the case where the last time stamped line is the last
                  one in the ALR list.
+
+            The comments are placed by ALR_Document_Class in one pass
+            over the file, rather than by re-scanning the file after each
+            comment.
     
     """
     
     # Path to the ACIS-LoadReview.txt file to be modified.
     ALR_file_path = os.path.join(ALR_path, "ACIS-LoadReview.txt")
     
-    # Open the load review text file
-    infile = open(ALR_file_path, 'r')
-    
-    # Read all of the ALR.txt lines
-    ALR_lines = infile.readlines()
+    # Read the load review text file
+    alr_doc = ALR_Document_Class.ALR_Document_Object(ALR_file_path)
     
-    # Done with the input file - close it.
-    infile.close()
-    
-    #
-    # Now find the indices of all those lines which have a time stamp at
-    # the start
-    #
-    # Define regular expressions to be used in backstop file line searches
-    time_stamp = re.compile('\\d\\d\\d\\d:\\d\\d\\d:\\d\\d:\\d\\d:\\d\\d.\\d\\d\\d')
-    
-    # Get the indices of all those lines which begin with a DOY time stamp
-    # This is the position of the time stamped line in the ALR file.
-    # Not all lines in the file begin with time stamps
-    time_stamped_line_indices = [index for index, eachline in enumerate(ALR_lines) if time_stamp.match(eachline)]
-    
-    # Next, get a list of the times in seconds for those lines which have a
-    # DOY time in them.  This is a one for one pairing of time_stamped_line_indices
-    event_times = [apt.secs(ALR_lines[eachindex].split()[0])  for eachindex in time_stamped_line_indices]
-    
-    # Now for each comment in the comments list, find the two indices
-    # between which the comment must fall based on time stamp
-    for each_comment in comment_list:
-
-        # Find all the times in the event_times list that are LEQ  the comment time in question
-        leq_times = [index for index, etime in enumerate(event_times) if etime <= each_comment[1]]
-
-        # If there is no time stamped line in the ACIS-LoadReview.txt file that occurs prior
-        # to the time stamp of this comment, do not display the comment. You will know
-        # there is no time stamped line if leq_times is an empty list
-        if len(leq_times) > 0:
-          
-            # before this comment, then place the comment before the first time stamped line.
-            # Now the last value in the leq_times list is the index into
-            # time_stamped_line_indices where you will obtain the location
-            # in the ALR list of where you want to insert the comment text
-            #
-            # The if statement is protection against the case where the last line time stamp
-            # and the comment time stamp is the same AND the last line time stamp is the
-            # last timed stamped line in ACIS-LoadReview.txt
-            if leq_times[-1] +1 < len( time_stamped_line_indices) :
-                insert_loc = time_stamped_line_indices[leq_times[-1] +1]
-            else:
-                 insert_loc = time_stamped_line_indices[leq_times[-1] ]
-                 
-            # At long last you now know where to insert the comment text
-            # It's before insert_loc
-            # Write the date (DOY) and the comment statement
-            ALR_lines.insert(insert_loc, "".join(("\n",  each_comment[2], "\n\n")) )
-        
-            # Since you've added lines, you have to re-calculate the indices of all those
-            # lines which begin with a DOY time stamp again.
-            # This is the position of the stamped line in the ALR file.
-            time_stamped_line_indices = [index for index, eachline in enumerate(ALR_lines) if time_stamp.match(eachline)]
-
-            # Re-generate the list of the times in seconds for those lines which have a
-            # DOY time in them.  This is a one for one pairing of time_stamped_line_indices
-            event_times = [apt.secs(ALR_lines[eachindex].split()[0])  for eachindex in time_stamped_line_indices]
+    # Insert the comments
+    alr_doc.Add_Comments(comment_list)
     
-    # So now you've updated the list of ALR lines to include any errors or
-    # comments that exist.
-    # Write the list out to a new file
-    outfile = open(ALR_file_path+"."+extension, 'w')
-    outfile.writelines(ALR_lines)
-    outfile.close()
+    # Write the updated lines out to a new file
+    alr_doc.Write(extension)
     
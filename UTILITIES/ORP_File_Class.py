@@ -94,11 +94,15 @@ class ORP_File_Class():
             # Split the line on spaces
             splitline = line.split()
         
-            # Append the data to the list
-            orp_data_list.append( [(splitline[0], apt.secs(splitline[0]), splitline[1], splitline[2], " ".join(splitline[3:]) )])
+            # Append the data to the list. The time column is filled in
+            # after the array is made.
+            orp_data_list.append( [(splitline[0], 0.0, splitline[1], splitline[2], " ".join(splitline[3:]) )])
         
         # Once you have the list of data make the array
         self.orp_data_array = np.array(orp_data_list, dtype = self.orp_dtype)
+
+        # Convert the entire GMT column into Chandra seconds in one call
+        self.orp_data_array['time'] = apt.secs_array(self.orp_data_array['GMT'])
         
         # Done with reading the input ORP file so close it.
         orp_file.close()
@@ -0,0 +1,69 @@
+################################################################################
+#
+# Time_Configuration - Configure astropy time conversions so that they never
+#                      reach out to the network.
+#
+################################################################################
+import apt_date_secs as apt
+
+"""
+Every UTC conversion in astropy can trigger a download of the IERS tables
+or the leap second file, or a check of how stale they are. On hosts
+without internet access those checks stall or print warnings.
+
+Configure_Astropy turns off all of those lookups and loads the leap
+second table bundled with apt_date_secs (UTILITIES/Leap_Second.dat), so
+that the conversions done by astropy and the numpy conversions done by
+apt_date_secs use the same table.
+
+Any program which uses astropy time, directly or through
+backstop_history, should call Configure_Astropy before converting times.
+It is also called by apt_date_secs the first time it needs astropy.
+Calling it more than once is harmless.
+
+astropy is only imported when Configure_Astropy is called, so importing
+this module costs nothing.
+"""
+
+# Set to True once astropy has been configured
+astropy_configured = False
+
+#-------------------------------------------------------------------------------
+#
+# Configure_Astropy
+#
+#-------------------------------------------------------------------------------
+def Configure_Astropy():
+    """
+    Disable IERS and leap second downloads and staleness checks, and pin
+    the leap second table to the one bundled with apt_date_secs.
+    """
+    global astropy_configured
+
+    if astropy_configured:
+        return
+
+    from astropy.time import update_leap_seconds
+    from astropy.utils import data
+    from astropy.utils import iers
+
+    # Never go to the internet for data files
+    data.conf.allow_internet = False
+
+    # Use the IERS-A table bundled with astropy; do not download a new one
+    # or complain about its age. Chandra seconds <-> UTC does not use UT1
+    # so the IERS-A predictions have no effect on the results.
+    iers.conf.auto_download = False
+    iers.conf.auto_max_age = None
+    iers.conf.iers_degraded_accuracy = 'ignore'
+
+    # The only leap second files astropy may look at are local ones
+    iers.conf.system_leap_second_file = apt.LEAP_SECOND_FILE
+    iers.conf.iers_leap_second_auto_url = ''
+    iers.conf.ietf_leap_second_auto_url = ''
+
+    # Load the bundled leap second table now, rather than on the first
+    # conversion
+    update_leap_seconds([apt.LEAP_SECOND_FILE])
+
+    astropy_configured = True
@@ -1,28 +1,309 @@
-from astropy.time import Time, TimeCxcSec
+import datetime
+import os
+import re
 
-"""
-  https://docs.astropy.org/en/stable/time/
+import numpy as np
 
+"""
   secs      Seconds since 1998-01-01T00:00:00 (TT)
   date      YYYY:DDD:hh:mm:ss.ss..
 
-    These functions are very thin wrappers around the Astropy Time
-    function.  The purpose is mainly to reduce typing and the 
-    possibility of typos. Basically they are convenience functions.
+    secs and date convert one value, or a sequence of values, between
+    DOY date strings and Chandra seconds. secs_array and date_array do
+    the same for a whole column at once and always return a numpy
+    array. Use them in place of calling secs or date inside a loop.
+
+    The conversions are done with numpy, using the leap second table in
+    Leap_Second.dat, which lives in the same directory as this file.
+    All of the values in a column are converted together; nothing is
+    done per value in python.
+
+    Astropy Time (https://docs.astropy.org/en/stable/time/) is used
+    only for the values the numpy engine does not handle:
 
-    Since the Time.now() function exists in Astropy Time, the
-    capability is included here.
+        - times before the start of the leap second table (1972) or
+          after the date the table expires
+        - date strings which are not full YYYY:DDD:hh:mm:ss[.sss]
+          strings, e.g. '2024:064' or '2024:064:12:00', or which are
+          badly formed
+        - times inside a leap second (ss = 60)
+        - times within a microsecond of half a millisecond, where the
+          rounding to milliseconds depends on erfa
+        - secs() and date() with no argument, which return the current
+          time from Time.now()
+
+    Only those values go to astropy; the rest of the column is still
+    converted with numpy. Astropy is imported the first time it is
+    needed, so most scripts never pay the cost of importing it.
+
+    Leap_Second.dat is the IERS file distributed with astropy. When
+    IERS publishes a new Bulletin C, copy the new file over this one.
+    Time_Configuration loads the same file into astropy.
 
 """
 
+# TT - TAI in seconds
+TT_MINUS_TAI = 32.184
+
+# Modified Julian Date of 1998:001 - the Chandra seconds epoch
+CXC_EPOCH_MJD = 50814
+
+# Offset between a python date ordinal and the Modified Julian Date
+ORDINAL_MINUS_MJD = 678576
+
+SECS_PER_DAY = 86400
+
+# Path to the bundled leap second table
+LEAP_SECOND_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Leap_Second.dat')
+
+#-------------------------------------------------------------------------------
+#
+# Read_Leap_Second_File
+#
+#-------------------------------------------------------------------------------
+def Read_Leap_Second_File(leap_file_path = LEAP_SECOND_FILE):
+    """
+    Read an IERS Leap_Second.dat file.
+
+    output: leap_mjd     - numpy array of the MJD on which each TAI-UTC
+                           value takes effect
+            leap_tai_utc - numpy array of TAI-UTC, in seconds
+            expires_mjd  - MJD on which the file expires. Dates on or after
+                           this day are handed to astropy.
+    """
+    leap_mjd = []
+    leap_tai_utc = []
+    expires_mjd = None
+
+    leap_file = open(leap_file_path, 'r')
+
+    for eachline in leap_file:
+        # Comment lines start with a #. The only one we need is the
+        # expiration date of the file.
+        if eachline.startswith('#'):
+            expires = re.search('File expires on\\s+(\\d+)\\s+(\\w+)\\s+(\\d+)', eachline)
+            if expires:
+                expires_date = datetime.datetime.strptime(' '.join(expires.groups()), '%d %B %Y')
+                expires_mjd = expires_date.toordinal() - ORDINAL_MINUS_MJD
+        elif eachline.strip():
+            # MJD  day month year  TAI-UTC
+            split_line = eachline.split()
+            leap_mjd.append(int(float(split_line[0])))
+            leap_tai_utc.append(float(split_line[4]))
+
+    leap_file.close()
+
+    # If no expiration date was given, trust the table only up to the
+    # last leap second it lists.
+    if expires_mjd is None:
+        expires_mjd = leap_mjd[-1]
+
+    return np.array(leap_mjd), np.array(leap_tai_utc), expires_mjd
+
+# Load the leap second table once when the module is imported
+leap_mjd, leap_tai_utc, leap_expires_mjd = Read_Leap_Second_File()
+
+# The Chandra time, in seconds, at which each TAI-UTC value takes effect
+leap_cxcsec = (leap_mjd - CXC_EPOCH_MJD) * float(SECS_PER_DAY) + leap_tai_utc + TT_MINUS_TAI
+
+# Chandra time at which the leap second table expires
+leap_expires_cxcsec = (leap_expires_mjd - CXC_EPOCH_MJD) * float(SECS_PER_DAY) + leap_tai_utc[-1] + TT_MINUS_TAI
+
+#-------------------------------------------------------------------------------
+#
+# Astropy fallbacks
+#
+#-------------------------------------------------------------------------------
+def _astropy_time():
+    # Import astropy only when it is actually needed, and configure it
+    # so that it never goes to the network
+    import Time_Configuration
+    Time_Configuration.Configure_Astropy()
+
+    from astropy.time import Time
+    return Time
+
+def _astropy_secs(intimes):
+    return _astropy_time()(intimes, format='yday', scale='utc').cxcsec
+
+def _astropy_date(intimes):
+    return _astropy_time()(intimes, format='cxcsec', scale='utc').yday
+
+#-------------------------------------------------------------------------------
+#
+# Numpy conversion engine
+#
+#-------------------------------------------------------------------------------
+def _ordinal_of_jan_1(year):
+    # Python date ordinal of January 1 of each year in the array
+    prev = year - 1
+    return prev * 365 + prev // 4 - prev // 100 + prev // 400 + 1
+
+def _digits(byte_cols):
+    # Convert a block of ASCII digit columns into an integer
+    value = np.zeros(byte_cols.shape[0], dtype = np.int64)
+    for col in range(byte_cols.shape[1]):
+        value = value * 10 + byte_cols[:, col]
+    return value
+
+def _fast_secs(date_strings):
+    """
+    Convert a 1-D array of stripped YYYY:DDD:hh:mm:ss.sss strings into
+    Chandra seconds.
+
+    Returns the array of times and a boolean array flagging those rows
+    which could not be converted here and must go to astropy.
+    """
+    n = date_strings.shape[0]
+    times = np.zeros(n, dtype = np.float64)
+    needs_astropy = np.ones(n, dtype = bool)
+
+    if n == 0:
+        return times, needs_astropy
+
+    # Only plain ASCII strings with at least YYYY:DDD:hh:mm:ss are handled here
+    try:
+        byte_strings = date_strings.astype('S')
+    except UnicodeEncodeError:
+        return times, needs_astropy
+
+    width = byte_strings.dtype.itemsize
+    if width < 17:
+        return times, needs_astropy
+
+    chars = byte_strings.view(np.uint8).reshape(n, width)
+
+    # Check the layout: digits and colons in the right spots, and an
+    # optional fraction of a second introduced by a period.
+    digit_cols = [0, 1, 2, 3, 5, 6, 7, 9, 10, 12, 13, 15, 16]
+    colon_cols = [4, 8, 11, 14]
+    digits = chars.astype(np.int64) - ord('0')
+    good = np.all((digits[:, digit_cols] >= 0) & (digits[:, digit_cols] <= 9), axis = 1)
+    good &= np.all(chars[:, colon_cols] == ord(':'), axis = 1)
+    if width > 17:
+        # Anything after the whole seconds must be ".ddd" padded with nulls
+        tail = chars[:, 17:]
+        tail_digits = digits[:, 18:]
+        good &= (tail[:, 0] == ord('.')) | (tail[:, 0] == 0)
+        good &= np.all(((tail_digits >= 0) & (tail_digits <= 9)) | (chars[:, 18:] == 0), axis = 1)
+
+    year = _digits(digits[:, 0:4])
+    doy = _digits(digits[:, 5:8])
+    hours = _digits(digits[:, 9:11])
+    minutes = _digits(digits[:, 12:14])
+    whole_secs = _digits(digits[:, 15:17])
+
+    # The fraction of a second, if there is one
+    fraction = np.zeros(n, dtype = np.float64)
+    if width > 18:
+        frac_digits = np.where(chars[:, 18:] == 0, 0, digits[:, 18:])
+        scale = 0.1 ** np.arange(1, width - 17)
+        fraction = frac_digits @ scale
+
+    # Days in each year, to range check the day of year
+    ordinal = _ordinal_of_jan_1(year)
+    days_in_year = _ordinal_of_jan_1(year + 1) - ordinal
+
+    # Leap seconds (ss = 60) are rare enough to leave to astropy
+    good &= (doy >= 1) & (doy <= days_in_year) & (hours < 24) & (minutes < 60) & (whole_secs < 60)
+
+    mjd = ordinal + doy - 1 - ORDINAL_MINUS_MJD
+
+    # Stay inside the span covered by the leap second table
+    good &= (mjd >= leap_mjd[0]) & (mjd < leap_expires_mjd)
+
+    # TAI - UTC in effect on each day
+    tai_utc = leap_tai_utc[np.clip(np.searchsorted(leap_mjd, mjd, side = 'right') - 1, 0, None)]
+
+    seconds_of_day = hours * 3600 + minutes * 60 + whole_secs
+
+    # Whole seconds and the fractional part are added separately to
+    # keep the full precision of the fraction
+    times = ((mjd - CXC_EPOCH_MJD) * SECS_PER_DAY + seconds_of_day).astype(np.float64) + \
+            (tai_utc + TT_MINUS_TAI + fraction)
+
+    needs_astropy = ~good
+
+    return times, needs_astropy
+
+def _fast_date(times):
+    """
+    Convert a 1-D array of Chandra seconds into YYYY:DDD:hh:mm:ss.sss
+    strings, rounded to the millisecond the same way astropy does.
+
+    Returns the array of dates and a boolean array flagging those rows
+    which could not be converted here and must go to astropy.
+    """
+    n = times.shape[0]
+    dates = np.zeros(n, dtype = 'U21')
+
+    # Non-finite values and times outside of the table go to astropy
+    good = np.isfinite(times) & (times >= leap_cxcsec[0]) & (times < leap_expires_cxcsec)
+
+    safe_times = np.where(good, times, leap_cxcsec[0])
+
+    # TAI - UTC in effect at each time
+    index = np.clip(np.searchsorted(leap_cxcsec, safe_times, side = 'right') - 1, 0, None)
+    tai_utc = leap_tai_utc[index]
+
+    # A time within a leap second (23:59:60) goes to astropy. Leave a
+    # little extra room so that rounding up to the next millisecond
+    # cannot carry into the leap second.
+    next_leap = np.append(leap_cxcsec, np.inf)[index + 1]
+    good &= safe_times < next_leap - 1.0005
+
+    # Milliseconds of UTC since 1998:001:00:00:00.000, rounded to the
+    # nearest millisecond.
+    utc_secs = safe_times - (tai_utc + TT_MINUS_TAI)
+    whole = np.floor(utc_secs)
+    frac_millisecs = (utc_secs - whole) * 1000.0
+    millisecs = whole.astype(np.int64) * 1000 + np.floor(frac_millisecs + 0.5).astype(np.int64)
+
+    # Which way a time within a microsecond of a half millisecond rounds
+    # depends on the round off inside erfa, so let astropy decide those.
+    good &= np.abs(frac_millisecs - np.floor(frac_millisecs) - 0.5) > 1.0e-3
+
+    days, ms_of_day = np.divmod(millisecs, SECS_PER_DAY * 1000)
+    ordinal = days + CXC_EPOCH_MJD + ORDINAL_MINUS_MJD
+
+    # Work out the year; the estimate can be off by one in either direction
+    year = (ordinal * 400) // 146097 + 1
+    year = np.where(_ordinal_of_jan_1(year) > ordinal, year - 1, year)
+    year = np.where(_ordinal_of_jan_1(year + 1) <= ordinal, year + 1, year)
+    doy = ordinal - _ordinal_of_jan_1(year) + 1
+
+    hours, remainder = np.divmod(ms_of_day, 3600000)
+    minutes, remainder = np.divmod(remainder, 60000)
+    whole_secs, millis = np.divmod(remainder, 1000)
+
+    # Write the ASCII characters straight into a byte buffer
+    chars = np.full((n, 21), ord(':'), dtype = np.uint8)
+    chars[:, 17] = ord('.')
+    for start, width, value in ((0, 4, year), (5, 3, doy), (9, 2, hours),
+                                (12, 2, minutes), (15, 2, whole_secs), (18, 3, millis)):
+        for col in range(width - 1, -1, -1):
+            value, digit = np.divmod(value, 10)
+            chars[:, start + col] = digit + ord('0')
+
+    dates = chars.view('S21').ravel().astype('U21')
+
+    return dates, ~good
+
+#-------------------------------------------------------------------------------
+#
+# Public conversions
+#
+#-------------------------------------------------------------------------------
 # Input in Chandra seconds; Output in DOY date string
 def date(intime=None):
     # If the user did not input a value for intime,
     # the user wants the present time in DOY string format
     if intime is None:
-        this_date = Time.now().yday
+        this_date = _astropy_time().now().yday
+    elif np.ndim(intime) == 0:
+        this_date = str(date_array([intime])[0])
     else:
-        this_date = Time(intime, format='cxcsec', scale='utc').yday         
+        this_date = date_array(intime)
     return this_date
 
 # Input in DOY date string; Output in Chandra seconds
@@ -30,19 +311,41 @@ def secs(intime = None):
     # If the user did not input a value for intime,
     # the user wants the present time in Chandra Seconds
     if intime is None:
-        this_time= Time.now().cxcsec
+        this_time= _astropy_time().now().cxcsec
+    elif np.ndim(intime) == 0:
+        this_time = secs_array([intime])[0]
     else:
-        this_time = Time(intime, format='yday', scale='utc').cxcsec
+        this_time = secs_array(intime)
     return this_time
 
+# Input is a sequence of Chandra seconds; Output is a numpy array
+# of DOY date strings in the same order
+def date_array(intimes):
+    # Convert the whole sequence in one call. An empty input
+    # gives an empty output.
+    times = np.atleast_1d(np.asarray(intimes, dtype = np.float64))
 
+    flat_times = times.ravel()
+    these_dates, needs_astropy = _fast_date(flat_times)
 
+    # Anything the numpy engine could not handle goes to astropy
+    if needs_astropy.any():
+        these_dates[needs_astropy] = _astropy_date(flat_times[needs_astropy])
 
+    return these_dates.reshape(times.shape)
 
+# Input is a sequence of DOY date strings; Output is a numpy array
+# of Chandra seconds in the same order
+def secs_array(intimes):
+    # Convert the whole sequence in one call. An empty input
+    # gives an empty output.
+    date_strings = np.char.strip(np.atleast_1d(np.asarray(intimes, dtype = str)))
 
+    flat_dates = date_strings.ravel()
+    these_times, needs_astropy = _fast_secs(flat_dates)
 
+    # Anything the numpy engine could not handle goes to astropy
+    if needs_astropy.any():
+        these_times[needs_astropy] = _astropy_secs(flat_dates[needs_astropy])
 
-
-
-
-        
+    return these_times.reshape(date_strings.shape)
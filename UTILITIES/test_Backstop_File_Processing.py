@@ -0,0 +1,150 @@
+################################################################################
+#
+# test_Backstop_File_Processing - Check the parsed backstop cache kept by
+#                                 Backstop_File_Class.Read_BS_File: that it
+#                                 is used, and that it is thrown away when
+#                                 it no longer matches the backstop file.
+#
+#   Usage: python3 test_Backstop_File_Processing.py
+#          or run under pytest
+#
+################################################################################
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import Backstop_File_Processing as bfp
+
+backstop_lines = ['2024:064:00:00:04.284 |     1061 0 | ACISPKT          | TLMSID= RH_0000001, CMDS= 3, WORDS= 3, PACKET(40)= D8000070007003000000000000000000000, SCS= 131, STEP= 25\n',
+                  '2024:064:00:00:28.665 |     1169 0 | SIMTRANS         | POS= -99616, SCS= 130, STEP= 5\n',
+                  '2024:064:00:54:56.647 |     2705 0 | ORBPOINT         | TYPE= EEF1000, SCS= 0, STEP= 0\n']
+
+def make_load():
+    """
+    Return a new directory holding a backstop file, and an empty cache
+    directory inside it.
+    """
+    load_dir = tempfile.mkdtemp()
+
+    outfile = open(os.path.join(load_dir, 'CR064_0000.backstop'), 'w')
+    outfile.writelines(backstop_lines)
+    outfile.close()
+
+    return load_dir, os.path.join(load_dir, 'cache')
+
+def read_without_parsing(backstop_file_path, cache_dir):
+    """
+    Read the backstop file with a reader which fails if it has to parse
+    the file, so the result must have come from the cache.
+    """
+    reader = bfp.Backstop_File_Class()
+    reader.Process_BS_Lines = None
+
+    return reader.Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+
+def test_cache_is_used():
+    """
+    The second read of an unchanged file comes from the cache, and is
+    the same as the first. Nothing is left in the load directory.
+    """
+    load_dir, cache_dir = make_load()
+    backstop_file_path = os.path.join(load_dir, 'CR064_0000.backstop')
+
+    try:
+        parsed = bfp.Backstop_File_Class().Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+        cached = read_without_parsing(backstop_file_path, cache_dir)
+
+        assert cached.dtype == parsed.dtype
+        assert np.array_equal(cached, parsed)
+        assert sorted(os.listdir(load_dir)) == ['CR064_0000.backstop', 'cache']
+        assert [each_file.endswith('.npz') for each_file in os.listdir(cache_dir)] == [True]
+    finally:
+        shutil.rmtree(load_dir)
+
+def test_cache_off_by_default():
+    """
+    Without use_cache nothing is written.
+    """
+    load_dir, cache_dir = make_load()
+
+    try:
+        bfp.Backstop_File_Class().Read_BS_File(os.path.join(load_dir, 'CR064_0000.backstop'), cache_dir = cache_dir)
+
+        assert not os.path.exists(cache_dir)
+    finally:
+        shutil.rmtree(load_dir)
+
+def test_touched_file_is_hashed():
+    """
+    A file whose modification time changed but whose contents did not
+    is matched by its hash and the cache is still used.
+    """
+    load_dir, cache_dir = make_load()
+    backstop_file_path = os.path.join(load_dir, 'CR064_0000.backstop')
+
+    try:
+        bfp.Backstop_File_Class().Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+
+        backstop_stat = os.stat(backstop_file_path)
+        os.utime(backstop_file_path, ns = (backstop_stat.st_atime_ns, backstop_stat.st_mtime_ns + 10**9))
+
+        read_without_parsing(backstop_file_path, cache_dir)
+    finally:
+        shutil.rmtree(load_dir)
+
+def test_stale_cache_is_rebuilt():
+    """
+    The cache is not used after the file changes, or if it was written
+    with a different CACHE_VERSION.
+    """
+    load_dir, cache_dir = make_load()
+    backstop_file_path = os.path.join(load_dir, 'CR064_0000.backstop')
+
+    try:
+        bfp.Backstop_File_Class().Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+
+        # Same size, different contents
+        outfile = open(backstop_file_path, 'w')
+        outfile.writelines(backstop_lines[:2] + [backstop_lines[2].replace('EEF1000', 'XEF1000')])
+        outfile.close()
+
+        changed = bfp.Backstop_File_Class().Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+        assert changed['event_type'][2] == 'XEF1000'
+
+        # The cache was rewritten for the new contents
+        read_without_parsing(backstop_file_path, cache_dir)
+
+        # A cache from another version of the code is ignored
+        bfp.CACHE_VERSION += 1
+        try:
+            assert bfp.Backstop_File_Class().Read_Cache(backstop_file_path, cache_dir) is None
+        finally:
+            bfp.CACHE_VERSION -= 1
+    finally:
+        shutil.rmtree(load_dir)
+
+def test_unwritable_cache_dir():
+    """
+    If the cache can't be written the file is still read, and no
+    temporary file is left behind.
+    """
+    load_dir, cache_dir = make_load()
+    backstop_file_path = os.path.join(load_dir, 'CR064_0000.backstop')
+
+    # A plain file where the cache directory should be
+    open(cache_dir, 'w').close()
+
+    try:
+        commands = bfp.Backstop_File_Class().Read_BS_File(backstop_file_path, use_cache = True, cache_dir = cache_dir)
+
+        assert len(commands) == 3
+        assert sorted(os.listdir(load_dir)) == ['CR064_0000.backstop', 'cache']
+    finally:
+        shutil.rmtree(load_dir)
+
+if __name__ == '__main__':
+    for each_test in (test_cache_is_used, test_cache_off_by_default, test_touched_file_is_hashed, test_stale_cache_is_rebuilt, test_unwritable_cache_dir):
+        each_test()
+        print('PASSED: ', each_test.__name__)
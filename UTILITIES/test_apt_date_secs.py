@@ -0,0 +1,64 @@
+################################################################################
+#
+# test_apt_date_secs - Cross check the numpy DOY <-> Chandra seconds
+#                      conversions in apt_date_secs against astropy over
+#                      the span of the mission.
+#
+#   Usage: python3 test_apt_date_secs.py
+#          or run under pytest
+#
+################################################################################
+import numpy as np
+from astropy.time import Time
+
+import apt_date_secs as apt
+
+# Launch through the expiration of the bundled leap second table
+mission_start = Time('1999:204:00:00:00.000', format='yday', scale='utc').cxcsec
+mission_stop = apt.leap_expires_cxcsec - 1.0
+
+# Random times over the mission plus the seconds around every leap second
+rng = np.random.default_rng(1999)
+random_times = rng.uniform(mission_start, mission_stop, 100000)
+leaps = apt.leap_cxcsec[apt.leap_cxcsec > mission_start]
+leap_times = np.concatenate([leaps + offset for offset in (-2.0, -1.0, -0.5, 0.0, 0.5, 1.0)])
+test_times = np.concatenate([random_times, leap_times])
+
+def test_date_array():
+    """
+    DOY strings from the numpy engine match astropy exactly.
+    """
+    expected = Time(test_times, format='cxcsec', scale='utc').yday
+    actual = apt.date_array(test_times)
+    mismatch = np.nonzero(actual != expected)[0]
+    assert len(mismatch) == 0, list(zip(test_times[mismatch], expected[mismatch], actual[mismatch]))
+
+def test_secs_array():
+    """
+    Chandra seconds from the numpy engine agree with astropy to well
+    under a microsecond, including for leap second (ss = 60) strings.
+    """
+    dates = Time(test_times, format='cxcsec', scale='utc').yday
+    expected = Time(dates, format='yday', scale='utc').cxcsec
+    actual = apt.secs_array(dates)
+    assert np.max(np.abs(actual - expected)) < 1.0e-6
+
+def test_scalars():
+    """
+    secs and date still take and return single values.
+    """
+    assert apt.secs('2018:064:20:11:59.529') == Time('2018:064:20:11:59.529', format='yday', scale='utc').cxcsec
+    assert apt.date(636759705.0) == Time(636759705.0, format='cxcsec', scale='utc').yday
+
+def test_out_of_range():
+    """
+    Values outside of the leap second table fall back to astropy.
+    """
+    dates = ['1965:001:00:00:00.000', '2099:001:00:00:00.000', '2024:064']
+    expected = Time(dates, format='yday', scale='utc').cxcsec
+    assert np.allclose(apt.secs_array(dates), expected, rtol = 0.0, atol = 1.0e-6)
+
+if __name__ == '__main__':
+    for each_test in (test_date_array, test_secs_array, test_scalars, test_out_of_range):
+        each_test()
+        print('PASSED: ', each_test.__name__)
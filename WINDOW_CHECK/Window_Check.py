@@ -3,11 +3,12 @@ from collections import Counter
 import numpy as np
 import os
 import re
-import subprocess
 import sys
 
 import SI_Mode_Class
 
+import ALR_Document_Class
+
 """
    Window_Check.py - Check any windows in each SI mode for the following faults:
  
@@ -86,22 +87,16 @@ si_mode_info = SI_Mode_Class.SI_Mode_Info()
 
 filespec = 'ACIS-LoadReview.txt'
 
-# Open the input ACIS-LoadReview.txt file
-in_alr = open(filespec, 'r')
-
-# Open the OUT ACIS-LoadReview.txt.WINDOW file
-#out_alr = open(filespec+'.WINDOW', 'w')
-out_alr = open('ACIS-LoadReview.txt.WINDOW', 'w')
+# Read the input ACIS-LoadReview.txt file. Any errors or warnings are
+# added to it, just after the line for the SI mode, and it is written
+# out at the end.
+alr_doc = ALR_Document_Class.ALR_Document_Object(filespec)
 
 si_modes = []
 
 # Collecting SI modes from the AIS-LoadReview.dat file
 # "alr" stands for ACIS_LoadReview.txt
-for eachline in in_alr:
-    # Write the line out to the output file; the \n at the end of the line
-    # will be preserved.
-    out_alr.write(eachline)
-
+for line_index, eachline in enumerate(alr_doc.lines):
     # Now check to see if this is the line which tells you what the
     # SI mode is for th eobservation. If it is, grab the SI mode and
     # text it for windows errors (if it hs windows)
@@ -161,14 +156,14 @@ for eachline in in_alr:
                 # .....write the error(s) to the ACIS_LoadReview.txt file
                 for eacherror in ccd_error_list:
                     print(eacherror[0])
-                    out_alr.write(eacherror[0]+'\n')
+                    alr_doc.Add_Lines_After(line_index, [eacherror[0]+'\n'])
                 
             # Write out any warnings that may have occurred
             if ccd_warning_list:
                 # Write the error(s) to the ACIS_LoadReview.txt file
                 for eachwarning in ccd_warning_list:
                     print(eachwarning[0])
-                    out_alr.write(eachwarning[0]+'\n')
+                    alr_doc.Add_Lines_After(line_index, [eachwarning[0]+'\n'])
     
         # Check for 2d window errors...if you have 2D windows....
         if si_mode_info.loadblocks_2d_keys:
@@ -180,21 +175,17 @@ for eachline in in_alr:
                 # .....write the error(s) to the ACIS_LoadReview.txt file
                for eacherror in ccd_error_list:
                     print(eacherror[0])
-                    out_alr.write(eacherror[0]+'\n')
+                    alr_doc.Add_Lines_After(line_index, [eacherror[0]+'\n'])
 
             # If you have warnings, tack the time onto the list
             if ccd_warning_list:
                 for eachwarning in ccd_warning_list:
                     print(eachwarning[0])
-                    out_alr.write(eachwarning[0]+'\n')
+                    alr_doc.Add_Lines_After(line_index, [eachwarning[0]+'\n'])
     
-# Close both the input an doutput files.
-in_alr.close()
-out_alr.close()
-
-# OK now copy the ACIS-LoadReview.txt.WINDOW file into ACIS-LoadReview.txt
+# OK now write the updated ACIS-LoadReview.txt
 try:
-    print('\nCopying ACIS-LoadReview.txt.WINDOW to ACIS-LoadReview.txt\n\n')
-    mv_status = subprocess.run(['mv', 'ACIS-LoadReview.txt.WINDOW', 'ACIS-LoadReview.txt'])
-except:
-    print('\nThe move command failed. Examine the ofls directory and look for the .WINDOW file.\n\n', mv_status)
+    print('\nWriting the window checks into ACIS-LoadReview.txt\n\n')
+    alr_doc.Write()
+except OSError as err:
+    print('\nThe write failed. ACIS-LoadReview.txt was left unchanged.\n\n', err)